@@ -4,6 +4,8 @@ const IdeasSection = () => {
   const [posts, setPosts] = useState([]);
   const [discussions, setDiscussions] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null); // X-Next-Cursor of the last page
+  const [loadingMore, setLoadingMore] = useState(false);
   const [discussionsLoading, setDiscussionsLoading] = useState(true);
   const [repoName, setRepoName] = useState("");
   const [idea, setIdea] = useState("");
@@ -25,23 +27,32 @@ const IdeasSection = () => {
   const [discussionReplyError, setDiscussionReplyError] = useState({}); // { [discussionId]: errorMsg }
   const [openDiscussionReplies, setOpenDiscussionReplies] = useState({}); // { [discussionId]: true/false }
 
-  const fetchPosts = () => {
-    setLoading(true);
-    console.log(
-      "Fetching posts from https://codeatlas1.onrender.com/api/posts"
-    );
-    fetch("https://codeatlas1.onrender.com/api/posts")
+  // The API returns one page of posts at a time; pass a cursor to fetch
+  // the page after it and append it to the list.
+  const fetchPosts = (before = null) => {
+    if (before) {
+      setLoadingMore(true);
+    } else {
+      setLoading(true);
+    }
+    const url =
+      "https://codeatlas1.onrender.com/api/posts" +
+      (before ? `?before=${encodeURIComponent(before)}` : "");
+    console.log(`Fetching posts from ${url}`);
+    fetch(url)
       .then((res) => {
         console.log("Response status:", res.status);
         if (!res.ok) {
           throw new Error(`HTTP error! status: ${res.status}`);
         }
+        setNextCursor(res.headers.get("X-Next-Cursor"));
         return res.json();
       })
       .then((data) => {
         console.log("Posts data received:", data);
-        setPosts(data);
+        setPosts((prev) => (before ? [...prev, ...data] : data));
         setLoading(false);
+        setLoadingMore(false);
       })
       .catch((error) => {
         console.error("Error fetching posts:", error);
@@ -49,6 +60,7 @@ const IdeasSection = () => {
           "Failed to load posts. Please check if the backend server is running."
         );
         setLoading(false);
+        setLoadingMore(false);
       });
   };
 
@@ -239,14 +251,26 @@ const IdeasSection = () => {
       });
   };
 
-  // Fetch comments for a post
+  // Fetch comments for a post, following X-Next-Cursor until the whole
+  // thread is loaded
   const fetchComments = (postId) => {
     setCommentLoading((prev) => ({ ...prev, [postId]: true }));
-    fetch(`https://codeatlas1.onrender.com/posts/${postId}/comments`)
-      .then((res) => res.json())
+    const loadPage = (after, loaded) =>
+      fetch(
+        `https://codeatlas1.onrender.com/api/posts/${postId}/comments` +
+          (after ? `?after=${encodeURIComponent(after)}` : "")
+      ).then(async (res) => {
+        const data = [...loaded, ...(await res.json())];
+        const next = res.headers.get("X-Next-Cursor");
+        return next ? loadPage(next, data) : data;
+      });
+    loadPage(null, [])
       .then((data) => {
         setComments((prev) => ({ ...prev, [postId]: data }));
         setCommentLoading((prev) => ({ ...prev, [postId]: false }));
+      })
+      .catch(() => {
+        setCommentLoading((prev) => ({ ...prev, [postId]: false }));
       });
   };
 
@@ -514,6 +538,16 @@ const IdeasSection = () => {
                   No ideas have been shared yet. Be the first!
                 </div>
               )}
+              {!loading && nextCursor && (
+                <button
+                  className="action-btn"
+                  type="button"
+                  disabled={loadingMore}
+                  onClick={() => fetchPosts(nextCursor)}
+                >
+                  {loadingMore ? "Loading..." : "Load more ideas"}
+                </button>
+              )}
             </div>
 
             <div className="compose-area">
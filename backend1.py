@@ -1,56 +1,142 @@
 
 import os
 import re
+import json
+import codecs
+import queue
 import requests
 import base64
-import google.generativeai as genai
-from flask import Flask, request, jsonify, session, make_response
+import functools
+import gzip
+import html
+import click
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify, session, make_response, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 from markdown import markdown
+from requests.adapters import HTTPAdapter
 import traceback
+import time
+import hashlib
+import hmac
+import random
+import socket
+import uuid
+import bisect
+import weakref
+import threading
+import multiprocessing
+from collections import namedtuple, OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import Engine
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 
 
 # --- Step 1: Load API Keys & Configure ---
 load_dotenv()
-app = Flask(__name__)
 
-# Ensure the instance folder exists
-os.makedirs(app.instance_path, exist_ok=True)
+# Extensions and routes are bound to an app in create_app(), so importing this
+# module stays cheap: no database work, no Gemini client, no background threads.
+db = SQLAlchemy()
+login_manager = LoginManager()
+api = Blueprint('api', __name__)
 
-# Ensure tmp directory exists for SQLite in production
-os.makedirs('/tmp', exist_ok=True)
+# Every app built in this process, so forked workers can reset their pools.
+created_apps = weakref.WeakSet()
 
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', os.urandom(32))
-# Use PostgreSQL in production, SQLite as local fallback
+def create_app(config=None):
+    """Build the Flask app. Schema creation is the separate `init-db` command."""
+    app = Flask(__name__)
 
+    # Ensure the instance folder exists
+    os.makedirs(app.instance_path, exist_ok=True)
 
-database_url = os.getenv('DATABASE_URL')
-if database_url and database_url.startswith('postgres://'):
-    # Fix for newer SQLAlchemy versions that require postgresql:// instead of postgres://
-    database_url = database_url.replace('postgres://', 'postgresql://', 1)
-app.config['SQLALCHEMY_DATABASE_URI'] = database_url or f"sqlite:///tmp/ideas.db"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
-# CORS configuration with explicit origins for credentialed requests
-CORS(app, supports_credentials=True, origins=["https://gitatlas.netlify.app"])
+    # Ensure tmp directory exists for SQLite in production
+    os.makedirs('/tmp', exist_ok=True)
 
-app.config['SESSION_COOKIE_SAMESITE'] = 'None'
-app.config['SESSION_COOKIE_SECURE'] = True  # Required for cross-site cookies over HTTPS
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', os.urandom(32))
+    # Use PostgreSQL in production, SQLite as local fallback
+    database_url = os.getenv('DATABASE_URL')
+    if database_url and database_url.startswith(('postgres://', 'postgresql://')):
+        # Fix for newer SQLAlchemy versions that require postgresql:// instead of postgres://,
+        # and default to psycopg 3 while requirements.txt installs psycopg2
+        database_url = 'postgresql+psycopg2://' + database_url.split('://', 1)[1]
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url or f"sqlite:///tmp/ideas.db"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = database_engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 
-login_manager = LoginManager()
-login_manager.init_app(app)
+    app.config['SESSION_COOKIE_SAMESITE'] = 'None'
+    app.config['SESSION_COOKIE_SECURE'] = True  # Required for cross-site cookies over HTTPS
+    if config:
+        app.config.update(config)
+
+    if not GITHUB_TOKEN or not GEMINI_API_KEY:
+        raise ValueError("🔴 Critical Error: GITHUB_TOKEN or GEMINI_API_KEY not found in .env file.")
+
+    db.init_app(app)
+    # CORS configuration with explicit origins for credentialed requests
+    # The browser hides response headers from cross-origin scripts unless
+    # exposed: paginated endpoints return the next page's cursor in
+    # X-Next-Cursor, and analyses report cache use and timings in headers.
+    CORS(app, supports_credentials=True, origins=["https://gitatlas.netlify.app"],
+         expose_headers=['X-Next-Cursor', 'X-Analysis-Cache', 'X-Analysis-Mode', 'Server-Timing'])
+    login_manager.init_app(app)
+    app.register_blueprint(api)
+    app.cli.add_command(init_db_command)
+    created_apps.add(app)
+    return app
+
+def database_engine_options(database_url):
+    """Connection pool settings, sized so all workers fit in DB_MAX_CONNECTIONS.
+
+    WEB_CONCURRENCY and WORKER_CONCURRENCY are exported by gunicorn.conf.py;
+    each DB_POOL_* variable overrides the computed value.
+    """
+    if database_url.startswith('sqlite'):
+        return {}
+    workers = int(os.getenv('WEB_CONCURRENCY', 1))
+    budget = max(2, int(os.getenv('DB_MAX_CONNECTIONS', 20)) // workers)
+    # Request threads and analysis job workers each hold a connection at most.
+    wanted = int(os.getenv('WORKER_CONCURRENCY', 8)) + ANALYSIS_JOB_WORKERS
+    pool_size = int(os.getenv('DB_POOL_SIZE', min(budget, wanted)))
+    return {
+        'pool_size': pool_size,
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', max(0, budget - pool_size))),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+    }
 
-# Initialize database tables on app startup (critical for production)
-def init_database():
+def create_schema():
+    """Create missing tables, and columns and indexes added to tables that already exist"""
+    db.create_all()
+    from sqlalchemy import inspect
+    inspector = inspect(db.engine)
+    quote = db.engine.dialect.identifier_preparer.quote
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=db.engine.dialect)
+                    connection.execute(db.text(
+                        f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"))
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+    create_search_index()
+
+def init_database(app):
     """Initialize database tables if they don't exist"""
     try:
         with app.app_context():
-            db.create_all()
+            create_schema()
             print("✅ Database tables created/verified successfully")
             
             # Verify tables exist by checking User table
@@ -64,11 +150,33 @@ def init_database():
         print(f"❌ Database initialization failed: {e}")
         return False
 
-# Call database initialization immediately
-init_database()
+@click.command('init-db')
+def init_db_command():
+    """Create or migrate the database schema: flask --app backend1 init-db"""
+    if not init_database(current_app):
+        raise SystemExit(1)
+
+def reset_after_fork():
+    """Drop connections inherited from the parent when a worker is forked.
+
+    The parent's sockets must not be shared, and threads do not survive a
+    fork, so the lazily started workers are forgotten and restart on demand.
+    """
+    for app in list(created_apps):
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+    github.reset_pool()
+    reset_password_pool()
+    job_workers.clear()
+    trending_prefetcher.clear()
+    api_catalog_refresher.clear()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=lambda: reset_after_fork())
 
 # Global error handler to ensure CORS headers are always applied
-@app.errorhandler(500)
+@api.app_errorhandler(500)
 def handle_500_error(e):
     response = jsonify({"error": "Internal server error"})
     response.status_code = 500
@@ -84,41 +192,1075 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.Text)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
 
 
 class Post(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    repo_name = db.Column(db.String(100), nullable=False)
+    repo_name = db.Column(db.String(100), nullable=False, index=True)
     idea = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     comments = db.relationship('Comment', backref='post', lazy=True, cascade="all, delete-orphan")
+    __table_args__ = (db.Index('ix_post_timestamp_id', 'timestamp', 'id'),)
 
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     text = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
+    __table_args__ = (db.Index('ix_comment_post_id_timestamp', 'post_id', 'timestamp'),)
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'text': self.text,
+            'timestamp': self.timestamp.strftime('%Y-%m-%d %H:%M')
+        }
+
+class AnalysisCache(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    owner = db.Column(db.String(100), nullable=False)
+    repo = db.Column(db.String(100), nullable=False)
+    head_sha = db.Column(db.String(40), nullable=False)
+    readme_hash = db.Column(db.String(64), nullable=False)
+    tree_hash = db.Column(db.String(64), nullable=False)
+    readme_summary = db.Column(db.Text, nullable=False)
+    structure_analysis = db.Column(db.Text, nullable=False)
+    setup_guide = db.Column(db.Text, nullable=False)
+    file_structure = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.UniqueConstraint('owner', 'repo', 'head_sha', name='uq_analysis_cache_head'),
+        db.Index('ix_analysis_cache_repo_updated', 'owner', 'repo', 'updated_at'),
+    )
+
+    def to_result(self):
+        return {
+            "readme_summary": self.readme_summary,
+            "structure_analysis": self.structure_analysis,
+            "setup_guide": self.setup_guide,
+            "file_structure": self.file_structure,
+        }
+
+class AnalysisJob(db.Model):
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    owner = db.Column(db.String(100), nullable=False)
+    repo = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    timings = db.Column(db.Text)
+    # The process holding the job ("host:pid") and when its claim lapses.
+    worker = db.Column(db.String(100))
+    lease_expires_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (db.Index('ix_analysis_job_repo_status', 'owner', 'repo', 'status'),)
+
+    def to_dict(self):
+        data = {
+            'job_id': self.id,
+            'repo': f"{self.owner}/{self.repo}",
+            'status': self.status,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat(),
+        }
+        if self.result:
+            data['result'] = json.loads(self.result)
+        if self.error:
+            data['error'] = self.error
+        if self.timings:
+            data['timings'] = json.loads(self.timings)
+        return data
 
 # Securely load API keys
 GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 
-if not GITHUB_TOKEN or not GEMINI_API_KEY:
-    raise ValueError("🔴 Critical Error: GITHUB_TOKEN or GEMINI_API_KEY not found in .env file.")
+# google.generativeai is slow to import, so the client is built on first use.
+model = None
+model_lock = threading.Lock()
+
+def get_model():
+    global model
+    if model is None:
+        with model_lock:
+            if model is None:
+                try:
+                    import google.generativeai as genai
+                    genai.configure(api_key=GEMINI_API_KEY)
+                    model = genai.GenerativeModel("gemini-2.5-pro")
+                except Exception as e:
+                    raise RuntimeError(f"🔴 Error configuring Gemini AI: {e}")
+    return model
+
+# --- Metrics ---
+# Counters and histograms live in per-OS-thread shards: recording only
+# touches the calling thread's dicts, so it never takes a lock. Shards are
+# keyed by native thread id rather than threading.local, so gevent's
+# greenlets, which share one OS thread and never yield while recording, share
+# one shard instead of allocating one each. /api/metrics sums the shards and
+# renders the Prometheus text format.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+class MetricsRegistry:
+    def __init__(self):
+        self._families = {}
+        self._shards = {}
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text):
+        self._families[name] = ('counter', help_text, None)
+
+    def gauge(self, name, help_text):
+        self._families[name] = ('gauge', help_text, None)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self._families[name] = ('histogram', help_text, buckets)
+
+    def _shard(self):
+        ident = threading.get_native_id()
+        shard = self._shards.get(ident)
+        if shard is None:
+            with self._lock:
+                # A new OS thread is a good moment to fold the shards of
+                # finished ones, so they do not pile up between scrapes.
+                self._fold_finished()
+                shard = self._shards[ident] = {}
+        return shard
+
+    def _fold_finished(self):
+        alive = {thread.native_id for thread in threading.enumerate()}
+        for ident in [ident for ident in self._shards if ident not in alive]:
+            self._merge(self._retired, self._shards.pop(ident))
+
+    def inc(self, name, labels=(), value=1):
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        shard = self._shard()
+        key = (name, labels)
+        buckets = self._families[name][2]
+        entry = shard.get(key)
+        if entry is None:
+            entry = shard[key] = [0] * (len(buckets) + 3)
+        # Layout: one slot per bucket, +Inf, sum, count.
+        entry[bisect.bisect_left(buckets, value)] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    def _merge(self, into, shard):
+        for key, value in shard.items():
+            if isinstance(value, list):
+                total = into.setdefault(key, [0] * len(value))
+                for i, v in enumerate(value):
+                    total[i] += v
+            else:
+                into[key] = into.get(key, 0) + value
+
+    def collect(self):
+        totals = {}
+        with self._lock:
+            self._fold_finished()
+            for shard in self._shards.values():
+                self._merge(totals, {k: (list(v) if isinstance(v, list) else v) for k, v in shard.copy().items()})
+            self._merge(totals, self._retired)
+        return totals
+
+    def render(self):
+        totals = self.collect()
+        lines = []
+        for name, (kind, help_text, buckets) in sorted(self._families.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (metric, labels), value in sorted(totals.items(), key=lambda item: item[0][1]):
+                if metric != name:
+                    continue
+                if kind != 'histogram':
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), value):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {value[-2]}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + '}'
+
+metrics = MetricsRegistry()
+metrics.histogram('codeatlas_http_request_duration_seconds', 'Request latency by route, method and status.')
+metrics.gauge('codeatlas_http_requests_in_flight', 'Requests currently being handled.')
+metrics.histogram('codeatlas_upstream_request_duration_seconds', 'Upstream call latency by upstream, endpoint and status.')
+metrics.counter('codeatlas_gemini_input_tokens_total', 'Estimated Gemini input tokens by prompt type.')
+metrics.histogram('codeatlas_db_query_duration_seconds', 'SQL statement latency.')
+metrics.histogram('codeatlas_db_queries_per_request', 'SQL statements executed per request.', COUNT_BUCKETS)
+metrics.histogram('codeatlas_db_time_per_request_seconds', 'Time spent in SQL per request.')
+metrics.histogram('codeatlas_markdown_render_seconds', 'Markdown to HTML rendering time.')
+metrics.counter('codeatlas_cache_requests_total', 'Cache lookups by cache and result.')
+metrics.counter('codeatlas_http_not_modified_total', '304 responses to If-None-Match, by route.')
+metrics.histogram('codeatlas_password_hash_queue_seconds', 'Time a password hash waited for a free slot, by operation.')
+metrics.histogram('codeatlas_password_hash_duration_seconds', 'Password hashing time in the process pool, by operation.')
+metrics.counter('codeatlas_password_hash_rejected_total', 'Password hashes rejected because the pool stayed busy.')
+
+request_db_stats = threading.local()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's execution context, which is discarded with it
+    # when the statement raises and after_cursor_execute never runs.
+    if context is not None:
+        context.query_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'query_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    metrics.observe('codeatlas_db_query_duration_seconds', elapsed)
+    if getattr(request_db_stats, 'active', False):
+        request_db_stats.queries += 1
+        request_db_stats.seconds += elapsed
+
+@api.before_app_request
+def _start_request_metrics():
+    g.request_started = time.perf_counter()
+    request_db_stats.active, request_db_stats.queries, request_db_stats.seconds = True, 0, 0.0
+    metrics.inc('codeatlas_http_requests_in_flight')
+
+@api.after_app_request
+def _record_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@api.teardown_app_request
+def _finish_request_metrics(exc):
+    if 'request_started' not in g:
+        return
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = str(g.get('response_status', 500))
+    metrics.observe('codeatlas_http_request_duration_seconds', time.perf_counter() - g.request_started,
+                    (('route', route), ('method', request.method), ('status', status)))
+    metrics.inc('codeatlas_http_requests_in_flight', value=-1)
+    if getattr(request_db_stats, 'active', False):
+        metrics.observe('codeatlas_db_queries_per_request', request_db_stats.queries, (('route', route),))
+        metrics.observe('codeatlas_db_time_per_request_seconds', request_db_stats.seconds, (('route', route),))
+        request_db_stats.active = False
+
+def record_cache(cache, result):
+    metrics.inc('codeatlas_cache_requests_total', (('cache', cache), ('result', result)))
+
+def record_upstream(upstream, endpoint, status, seconds):
+    metrics.observe('codeatlas_upstream_request_duration_seconds', seconds,
+                    (('upstream', upstream), ('endpoint', endpoint), ('status', str(status))))
+
+def render_markdown(text):
+    started = time.perf_counter()
+    rendered = markdown(text)
+    metrics.observe('codeatlas_markdown_render_seconds', time.perf_counter() - started)
+    return rendered
+
+# --- Caching ---
+class LRUCache:
+    """Thread-safe LRU cache bounded by entry count and total size."""
+
+    def __init__(self, max_entries, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def set(self, key, value, size=1):
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.total_bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or
+                                     (self.max_bytes and self.total_bytes > self.max_bytes)):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            value, size = self._entries.pop(key)
+            self.total_bytes -= size
+            return value
 
+    def __len__(self):
+        return len(self._entries)
+
+def content_hash(text):
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+analysis_lru = LRUCache(int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', 256)),
+                        int(os.getenv('ANALYSIS_CACHE_MAX_BYTES', 64 * 1024 * 1024)))
+analysis_responses = LRUCache(int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', 256)),
+                              int(os.getenv('ANALYSIS_CACHE_MAX_BYTES', 64 * 1024 * 1024)))
+# Analyses kept per repository in AnalysisCache; older heads are pruned as
+# new ones are stored.
+ANALYSIS_CACHE_HEADS_PER_REPO = int(os.getenv('ANALYSIS_CACHE_HEADS_PER_REPO', 5))
+analysis_cache_stats = {'memory_hits': 0, 'db_hits': 0, 'partial_hits': 0, 'misses': 0}
+analysis_cache_stats_lock = threading.Lock()
+
+def record_analysis_cache(outcome):
+    with analysis_cache_stats_lock:
+        analysis_cache_stats[outcome] += 1
+    record_cache('analysis', outcome.replace('_hits', '_hit').replace('misses', 'miss'))
+
+# --- HTTP Caching ---
+# Hot read endpoints serialize a response once into an EncodedBody: the JSON
+# bytes, a strong ETag and compressed copies made on first request and kept
+# with it. A matching If-None-Match gets a 304 without re-serializing. Each
+# content coding gets its own ETag suffix, as the bytes differ.
 try:
-    genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel("gemini-2.5-pro")
-except Exception as e:
-    raise RuntimeError(f"🔴 Error configuring Gemini AI: {e}")
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+ENCODING_TAGS = {'br': 'br', 'gzip': 'gz'}
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+class EncodedBody:
+    """A serialized JSON response with its ETag and compressed variants."""
+
+    def __init__(self, body, headers=None):
+        self.body = body
+        self.headers = headers or {}
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self._encoded = {}
+
+    def encoded(self, encoding):
+        if encoding not in self._encoded:
+            self._encoded[encoding] = compress(self.body, encoding)
+        return self._encoded[encoding]
+
+def accepted_encoding(size):
+    """Best content coding the client accepts for a body this size, or None."""
+    if size < COMPRESS_MIN_BYTES:
+        return None
+    accepted = {}
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        name, _, params = part.partition(';')
+        weight = 1.0
+        if params.strip().startswith('q='):
+            try:
+                weight = float(params.strip()[2:])
+            except ValueError:
+                weight = 0.0
+        accepted[name.strip().lower()] = weight
+    for encoding in (('br',) if brotli else ()) + ('gzip',):
+        if accepted.get(encoding, 0) > 0:
+            return encoding
+    return None
+
+def etag_matches(etag):
+    """Whether If-None-Match names etag, in any content coding."""
+    header = request.headers.get('If-None-Match', '')
+    if header.strip() == '*':
+        return True
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag.strip('"').split('-')[0] == etag:
+            return True
+    return False
+
+def entity_response(entity, cache_control='no-cache', headers=None):
+    """Serve entity: a 304 if a GET or HEAD client has it, else compressed if accepted."""
+    encoding = accepted_encoding(len(entity.body))
+    response_headers = dict(entity.headers, **(headers or {}))
+    response_headers['ETag'] = f'"{entity.etag}-{ENCODING_TAGS[encoding]}"' if encoding else f'"{entity.etag}"'
+    response_headers['Cache-Control'] = cache_control
+    if len(entity.body) >= COMPRESS_MIN_BYTES:
+        response_headers['Vary'] = 'Accept-Encoding'
+    # RFC 9110 only allows 304 for GET and HEAD; other methods get the body.
+    if request.method in ('GET', 'HEAD') and etag_matches(entity.etag):
+        metrics.inc('codeatlas_http_not_modified_total', (('route', request.url_rule.rule),))
+        return Response(status=304, headers=response_headers)
+    if encoding:
+        response_headers['Content-Encoding'] = encoding
+        return Response(entity.encoded(encoding), mimetype='application/json', headers=response_headers)
+    return Response(entity.body, mimetype='application/json', headers=response_headers)
+
+@api.after_app_request
+def _compress_large_json(response):
+    """Compress other large JSON responses on the fly."""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or response.mimetype != 'application/json' or 'Content-Encoding' in response.headers):
+        return response
+    body = response.get_data()
+    if len(body) >= COMPRESS_MIN_BYTES:
+        response.vary.add('Accept-Encoding')
+    encoding = accepted_encoding(len(body))
+    if encoding:
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+# Forum reads are cached per URL and forum version, which changes whenever a
+# post or comment is added (posts and comments are never edited).
+forum_responses = LRUCache(int(os.getenv('FORUM_RESPONSE_CACHE_MAX_ENTRIES', 1024)), 64 * 1024 * 1024)
+
+def forum_version():
+    """Newest post id and timestamp and newest comment id, each an index lookup."""
+    return db.session.execute(db.select(
+        db.select(db.func.max(Post.id)).scalar_subquery(),
+        db.select(db.func.max(Post.timestamp)).scalar_subquery(),
+        db.select(db.func.max(Comment.id)).scalar_subquery(),
+    )).one()
+
+def forum_cached(view):
+    """Serve a forum GET route's 200 responses through entity_response."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = (request.full_path, tuple(forum_version()))
+        entity = forum_responses.get(key)
+        record_cache('forum_response', 'hit' if entity else 'miss')
+        if entity is None:
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            headers = {name: value for name, value in response.headers.items()
+                       if name not in ('Content-Type', 'Content-Length')}
+            entity = EncodedBody(response.get_data(), headers)
+            forum_responses.set(key, entity, len(entity.body) * 2)
+        return entity_response(entity)
+    return wrapper
+
+# --- Authentication ---
+# Password hashing is a deliberately slow KDF. It runs in a small process pool
+# so a burst of logins cannot hold the GIL and stall the request threads; the
+# semaphore caps queued work, and callers past PASSWORD_HASH_QUEUE_TIMEOUT get
+# PasswordHashBusy instead of waiting indefinitely.
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_CONCURRENCY = int(os.getenv('PASSWORD_HASH_CONCURRENCY', PASSWORD_HASH_WORKERS * 4))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv('PASSWORD_HASH_QUEUE_TIMEOUT', 5))
+password_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_CONCURRENCY)
+password_pool = None
+password_pool_lock = threading.Lock()
+
+class PasswordHashBusy(Exception):
+    pass
+
+def get_password_pool():
+    """Start the pool on first use; spawned workers only import werkzeug."""
+    global password_pool
+    with password_pool_lock:
+        if password_pool is None:
+            password_pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS,
+                                                mp_context=multiprocessing.get_context('spawn'))
+        return password_pool
+
+def reset_password_pool():
+    global password_pool, password_hash_slots
+    password_pool = None
+    password_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_CONCURRENCY)
+
+def _run_password_hash(operation, func, *args):
+    global password_pool
+    queued = time.perf_counter()
+    if not password_hash_slots.acquire(timeout=PASSWORD_HASH_QUEUE_TIMEOUT):
+        metrics.inc('codeatlas_password_hash_rejected_total')
+        raise PasswordHashBusy()
+    try:
+        started = time.perf_counter()
+        metrics.observe('codeatlas_password_hash_queue_seconds', started - queued, (('operation', operation),))
+        pool = get_password_pool()
+        try:
+            result = pool.submit(func, *args).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start a fresh pool next time.
+            with password_pool_lock:
+                if password_pool is pool:
+                    password_pool = None
+            raise
+        metrics.observe('codeatlas_password_hash_duration_seconds', time.perf_counter() - started,
+                        (('operation', operation),))
+        return result
+    finally:
+        password_hash_slots.release()
+
+def hash_password(password):
+    return _run_password_hash('hash', generate_password_hash, password)
+
+def verify_password(password_hash, password):
+    return _run_password_hash('verify', check_password_hash, password_hash, password)
+
+# load_user runs on every authenticated request. It serves a detached copy of
+# the user from this cache; entries expire after USER_CACHE_TTL so other
+# workers' changes are picked up, and are dropped on logout and when this
+# process updates or deletes the user.
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 300))
+user_cache = LRUCache(int(os.getenv('USER_CACHE_MAX_ENTRIES', 10000)))
+
+@login_manager.user_loader
+def load_user(user_id):
+    user_id = int(user_id)
+    cached = user_cache.get(user_id)
+    if cached and cached[0] > time.monotonic():
+        record_cache('user', 'hit')
+        return User(id=user_id, username=cached[1])
+    record_cache('user', 'miss')
+    user = db.session.get(User, user_id)
+    if user is None:
+        user_cache.pop(user_id)
+        return None
+    user_cache.set(user_id, (time.monotonic() + USER_CACHE_TTL, user.username))
+    return user
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_cached_user(mapper, connection, target):
+    user_cache.pop(target.id)
+
+# --- GitHub Client ---
+class GitHubClient:
+    """Pooled GitHub API client shared by every route.
+
+    Keeps connections alive across requests, revalidates previously seen
+    responses with ETag/Last-Modified (a 304 is served from the local body
+    cache and does not count against the rate limit), retries secondary rate
+    limits with jittered backoff and slows down before the quota runs out.
+    """
+
+    RETRY_STATUSES = (403, 429, 502, 503, 504)
+
+    def __init__(self, token, base_url='https://api.github.com', pool_size=32, max_retries=3,
+                 rate_limit_reserve=100, max_throttle=10.0, body_cache_bytes=32 * 1024 * 1024):
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.rate_limit_reserve = rate_limit_reserve
+        self.max_throttle = max_throttle
+        self.token = token
+        self.pool_size = pool_size
+        self.session = self._new_session()
+        self._validators = LRUCache(4096, body_cache_bytes)
+        self._rate_limits = {}
+        self._lock = threading.Lock()
+
+    def _resource(self, url):
+        return 'search' if '/search/' in url else 'core'
+
+    def _throttle(self, resource):
+        with self._lock:
+            remaining, reset = self._rate_limits.get(resource, (None, None))
+        if remaining is None or remaining > self.rate_limit_reserve:
+            return
+        # Spread what is left of the quota over the rest of the window.
+        delay = min(max(reset - time.time(), 0) / max(remaining, 1), self.max_throttle)
+        if delay > 0:
+            print(f"GitHub {resource} quota low ({remaining} left), throttling {delay:.2f}s")
+            time.sleep(delay)
+
+    def _record_rate_limit(self, url, response):
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset = response.headers.get('X-RateLimit-Reset')
+        if remaining is None or reset is None:
+            return
+        resource = response.headers.get('X-RateLimit-Resource', self._resource(url))
+        with self._lock:
+            self._rate_limits[resource] = (int(remaining), int(reset))
+
+    def _retry_delay(self, response, attempt):
+        retry_after = response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            delay = int(retry_after)
+        elif response.headers.get('X-RateLimit-Remaining') == '0' and response.headers.get('X-RateLimit-Reset'):
+            delay = int(response.headers['X-RateLimit-Reset']) - time.time()
+        else:
+            delay = 2 ** attempt
+        return min(max(delay, 0) + random.uniform(0, 1), self.max_throttle)
+
+    def _is_retryable(self, response):
+        if response.status_code not in self.RETRY_STATUSES:
+            return False
+        if response.status_code != 403:
+            return True
+        # A plain 403 is a permission error; only retry rate limiting.
+        return (response.headers.get('X-RateLimit-Remaining') == '0' or 'Retry-After' in response.headers
+                or 'rate limit' in response.text.lower())
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({"Accept": "application/vnd.github.v3+json"})
+        if self.token:
+            session.headers["Authorization"] = f"Bearer {self.token}"
+        return session
+
+    def reset_pool(self):
+        """Start over with fresh connections (used in forked children)."""
+        self.session = self._new_session()
+
+    def get(self, path, accept=None, timeout=15, stream=False):
+        """GET an API path (or absolute URL) and return the requests.Response.
+
+        Callers are expected to call raise_for_status(). Streamed responses
+        bypass the conditional-request cache.
+        """
+        url = path if path.startswith('http') else f"{self.base_url}{path}"
+        headers = {"Accept": accept} if accept else {}
+        cache_key = (url, accept)
+        cached = None if stream else self._validators.get(cache_key)
+        if cached:
+            if cached.headers.get('ETag'):
+                headers['If-None-Match'] = cached.headers['ETag']
+            if cached.headers.get('Last-Modified'):
+                headers['If-Modified-Since'] = cached.headers['Last-Modified']
+
+        endpoint = github_endpoint_label(url)
+        for attempt in range(self.max_retries + 1):
+            self._throttle(self._resource(url))
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, headers=headers, timeout=timeout, stream=stream)
+            except requests.exceptions.RequestException as e:
+                record_upstream('github', endpoint, type(e).__name__, time.perf_counter() - started)
+                raise
+            record_upstream('github', endpoint, response.status_code, time.perf_counter() - started)
+            self._record_rate_limit(url, response)
+            if attempt == self.max_retries or not self._is_retryable(response):
+                break
+            delay = self._retry_delay(response, attempt)
+            print(f"GitHub {response.status_code} for {url}, retrying in {delay:.2f}s")
+            response.close()
+            time.sleep(delay)
+
+        if cached:
+            record_cache('github_conditional', 'hit' if response.status_code == 304 else 'miss')
+        if response.status_code == 304 and cached:
+            return cached
+        if not stream and response.ok and (response.headers.get('ETag') or response.headers.get('Last-Modified')):
+            self._validators.set(cache_key, response, len(response.content))
+        return response
+
+GITHUB_ENDPOINT_PATTERNS = (
+    (re.compile(r'^/repos/[^/]+/[^/]+'), '/repos/{owner}/{repo}'),
+    (re.compile(r'/git/trees/[^/]+$'), '/git/trees/{sha}'),
+    (re.compile(r'/commits/[^/]+$'), '/commits/{ref}'),
+)
+
+def github_endpoint_label(url):
+    """Collapse an API URL into a low-cardinality metrics label."""
+    path = requests.utils.urlparse(url).path
+    for pattern, replacement in GITHUB_ENDPOINT_PATTERNS:
+        path = pattern.sub(replacement, path)
+    return path
+
+github = GitHubClient(GITHUB_TOKEN,
+                      base_url=os.getenv('GITHUB_API_URL', 'https://api.github.com'),
+                      pool_size=int(os.getenv('GITHUB_POOL_SIZE', 32)),
+                      rate_limit_reserve=int(os.getenv('GITHUB_RATE_LIMIT_RESERVE', 100)))
+
+# --- Repository Tree ---
+# Large monorepos have trees with 100k+ entries, which GitHub truncates.
+# Trees are parsed incrementally into a TreeIndex of bounded size (counts,
+# histograms, manifests, entry points and a per-directory sample of paths),
+# so memory stays flat and the prompt sees a representative summary rather
+# than the first few hundred paths alphabetically.
+MANIFEST_FILES = {
+    'package.json', 'requirements.txt', 'pyproject.toml', 'setup.py', 'setup.cfg', 'Pipfile', 'environment.yml',
+    'Cargo.toml', 'go.mod', 'pom.xml', 'build.gradle', 'build.gradle.kts', 'Gemfile', 'composer.json',
+    'CMakeLists.txt', 'Makefile', 'Dockerfile', 'docker-compose.yml', 'docker-compose.yaml', 'mix.exs',
+    'pubspec.yaml', 'Package.swift', 'deno.json', 'tsconfig.json', 'vite.config.js', 'vite.config.ts',
+}
+ENTRY_POINT_FILES = {
+    'main.py', 'app.py', '__main__.py', 'manage.py', 'wsgi.py', 'asgi.py', 'server.py', 'cli.py',
+    'index.js', 'index.ts', 'main.js', 'main.ts', 'server.js', 'server.ts', 'app.js', 'app.ts',
+    'index.jsx', 'index.tsx', 'App.jsx', 'App.tsx', 'main.go', 'main.rs', 'lib.rs', 'Main.java',
+    'Program.cs', 'main.c', 'main.cpp', 'index.php', 'main.dart', 'main.swift',
+}
+TREE_SAMPLE_PER_DIR = 8
+TREE_LISTING_MAX = 200
+TREE_MAX_TRACKED_DIRS = 5000
+TREE_MAX_SUBTREES = int(os.getenv('TREE_MAX_SUBTREES', 100))
+TREE_FETCH_CONCURRENCY = int(os.getenv('TREE_FETCH_CONCURRENCY', 8))
+
+class TreeIndex:
+    """Compact, size-bounded summary of a repository tree."""
+
+    def __init__(self):
+        self.file_count = 0
+        self.dir_count = 0
+        self.incomplete = False
+        self.top_dirs = {}
+        self.sub_dirs = {}
+        self.extensions = {}
+        self.manifests = []
+        self.entry_points = []
+        self.root_files = []
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, entry, prefix=''):
+        path = prefix + entry['path']
+        with self._lock:
+            if entry['type'] == 'tree':
+                self.dir_count += 1
+                return
+            if entry['type'] != 'blob':
+                return
+            self.file_count += 1
+            parts = path.split('/')
+            name = parts[-1]
+            if len(parts) == 1:
+                if len(self.root_files) < TREE_LISTING_MAX:
+                    self.root_files.append(path)
+            else:
+                top = parts[0]
+                if top in self.top_dirs or len(self.top_dirs) < TREE_MAX_TRACKED_DIRS:
+                    self.top_dirs[top] = self.top_dirs.get(top, 0) + 1
+                if len(parts) > 2:
+                    sub = '/'.join(parts[:2])
+                    if sub in self.sub_dirs or len(self.sub_dirs) < TREE_MAX_TRACKED_DIRS:
+                        self.sub_dirs[sub] = self.sub_dirs.get(sub, 0) + 1
+                # Keep the shallowest few paths of each top-level directory.
+                sample = self.samples.get(top)
+                if sample is None and len(self.samples) < TREE_LISTING_MAX:
+                    sample = self.samples[top] = []
+                if sample is not None:
+                    sample.append((len(parts), path))
+                    if len(sample) > TREE_SAMPLE_PER_DIR:
+                        sample.sort()
+                        sample.pop()
+            dot = name.rfind('.')
+            ext = name[dot:].lower() if dot > 0 else name
+            if ext in self.extensions or len(self.extensions) < TREE_MAX_TRACKED_DIRS:
+                self.extensions[ext] = self.extensions.get(ext, 0) + 1
+            if name in MANIFEST_FILES and len(self.manifests) < 50:
+                self.manifests.append(path)
+            if name in ENTRY_POINT_FILES and len(self.entry_points) < 30:
+                self.entry_points.append(path)
+
+    def listing(self, limit=TREE_LISTING_MAX):
+        """Newline-separated representative file paths."""
+        paths = list(dict.fromkeys(self.manifests + self.entry_points + self.root_files))
+        by_dir = sorted(self.samples.items(), key=lambda item: -self.top_dirs.get(item[0], 0))
+        for rank in range(TREE_SAMPLE_PER_DIR):
+            for _, sample in by_dir:
+                ordered = sorted(sample)
+                if rank < len(ordered):
+                    paths.append(ordered[rank][1])
+        return "\n".join(sorted(dict.fromkeys(paths[:limit])))
+
+    def summary(self):
+        """Bounded text description of the tree for prompts."""
+        def top(counts, n):
+            return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:n]
+
+        lines = [f"{self.file_count} files in {self.dir_count} directories"
+                 + (" (tree incomplete: repository too large to list fully)" if self.incomplete else "")]
+        if self.top_dirs:
+            lines.append("Top-level directories (file counts): " +
+                         ", ".join(f"{name}/ ({count})" for name, count in top(self.top_dirs, 30)))
+        if self.sub_dirs:
+            lines.append("Largest subdirectories: " +
+                         ", ".join(f"{name}/ ({count})" for name, count in top(self.sub_dirs, 20)))
+        if self.extensions:
+            lines.append("File types: " + ", ".join(f"{ext} ({count})" for ext, count in top(self.extensions, 15)))
+        if self.manifests:
+            lines.append("Manifests and build files: " + ", ".join(self.manifests))
+        if self.entry_points:
+            lines.append("Likely entry points: " + ", ".join(self.entry_points))
+        lines.append("Representative files:")
+        lines.append(self.listing())
+        return "\n".join(lines)
+
+TREE_ARRAY_START = re.compile(r'"tree"\s*:\s*\[')
+
+class TreeStreamParser:
+    """Incrementally parse a git/trees response, yielding one entry at a time."""
+
+    def __init__(self):
+        self.buffer = ''
+        self.state = 'prefix'
+        self.tail = ''
+        self._decoder = json.JSONDecoder()
+
+    def feed(self, text):
+        self.buffer += text
+        if self.state == 'prefix':
+            match = TREE_ARRAY_START.search(self.buffer)
+            if not match:
+                return
+            self.buffer = self.buffer[match.end():]
+            self.state = 'entries'
+        if self.state == 'entries':
+            pos = 0
+            while True:
+                while pos < len(self.buffer) and self.buffer[pos] in ' \t\r\n,':
+                    pos += 1
+                if pos >= len(self.buffer):
+                    break
+                if self.buffer[pos] == ']':
+                    self.state = 'suffix'
+                    pos += 1
+                    break
+                try:
+                    entry, pos = self._decoder.raw_decode(self.buffer, pos)
+                except json.JSONDecodeError:
+                    break  # entry continues in the next chunk
+                yield entry
+            self.buffer = self.buffer[pos:]
+        if self.state == 'suffix':
+            self.tail += self.buffer
+            self.buffer = ''
+
+    @property
+    def truncated(self):
+        return bool(re.search(r'"truncated"\s*:\s*true', self.tail))
+
+def _stream_tree_into(index, path, prefix=''):
+    """Stream a tree into index; returns whether GitHub truncated it."""
+    response = github.get(path, timeout=30, stream=True)
+    with response:
+        response.raise_for_status()
+        parser = TreeStreamParser()
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            check_cancelled()
+            for entry in parser.feed(decoder.decode(chunk)):
+                index.add(entry, prefix)
+        for entry in parser.feed(decoder.decode(b'', final=True)):
+            index.add(entry, prefix)
+    return parser.truncated
+
+def _index_tree_by_subtrees(owner, repo_name, ref):
+    index = TreeIndex()
+    root = github.get(f"/repos/{owner}/{repo_name}/git/trees/{ref}", timeout=15)
+    root.raise_for_status()
+    subtrees = []
+    for entry in root.json()['tree']:
+        index.add(entry)
+        if entry['type'] == 'tree':
+            subtrees.append(entry)
+    if len(subtrees) > TREE_MAX_SUBTREES:
+        index.incomplete = True
+        subtrees = subtrees[:TREE_MAX_SUBTREES]
+
+    cancelled = getattr(stage_context, 'cancelled', None)
+
+    def fetch(entry):
+        stage_context.cancelled = cancelled
+        check_cancelled()
+        path = f"/repos/{owner}/{repo_name}/git/trees/{entry['sha']}?recursive=1"
+        return _stream_tree_into(index, path, prefix=entry['path'] + '/')
+
+    with ThreadPoolExecutor(max_workers=TREE_FETCH_CONCURRENCY, thread_name_prefix='tree') as executor:
+        if any(executor.map(fetch, subtrees)):
+            index.incomplete = True
+    return index
+
+# --- Prompt Budget ---
+# READMEs of popular repos can run to hundreds of KB of badges, HTML,
+# tables and translations. Before prompting, the README is stripped of that
+# noise, split into sections, de-duplicated and packed into a token budget
+# with install/usage/feature sections first.
+README_TOKEN_BUDGET = int(os.getenv('README_TOKEN_BUDGET', 6000))
+TREE_TOKEN_BUDGET = int(os.getenv('TREE_TOKEN_BUDGET', 2500))
+CHARS_PER_TOKEN = 4
+
+SECTION_PRIORITIES = (
+    (3, ('install', 'getting started', 'quick start', 'quickstart', 'setup', 'set up', 'usage', 'requirement',
+         'prerequisite', 'feature', 'overview', 'about', 'introduction', 'how to use', 'running', 'build')),
+    (2, ('example', 'configuration', 'config', 'environment', 'development', 'deploy', 'docker', 'api', 'test')),
+    (-1, ('license', 'contributor', 'contributing', 'acknowledg', 'sponsor', 'backer', 'star history', 'changelog',
+          'citation', 'cite', 'code of conduct', 'author', 'donat', 'support', 'community', 'translation', 'faq',
+          'roadmap', 'related', 'thanks', 'credits')),
+)
+HTML_COMMENT = re.compile(r'<!--.*?-->', re.S)
+HTML_BLOCK = re.compile(r'<(picture|svg|table|details)\b.*?</\1>', re.S | re.I)
+HTML_TAG = re.compile(r'</?[a-zA-Z][^>]*>')
+BADGE_LINK = re.compile(r'\[!\[[^\]]*\]\([^)]*\)\]\([^)]*\)')
+IMAGE = re.compile(r'!\[[^\]]*\]\([^)]*\)')
+LINK_DEFINITION = re.compile(r'^\s*\[[^\]]+\]:\s*\S+.*$', re.M)
+MARKDOWN_LINK = re.compile(r'\[([^\]]*)\]\([^)]*\)')
+HEADING = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+
+def estimate_tokens(text):
+    return (len(text or '') + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def fit_to_budget(text, budget):
+    """Truncate text to roughly budget tokens at a line boundary."""
+    limit = budget * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind('\n', 0, limit)
+    if cut < limit // 2:
+        cut = text.rfind(' ', 0, limit)
+    return text[:cut if cut > 0 else limit].rstrip() + "\n..."
+
+def _split_fences(text):
+    """Split Markdown into (is_code, text) runs at fenced code blocks."""
+    runs, run, in_fence = [], [], False
+    for line in text.splitlines():
+        fence = line.lstrip().startswith(('```', '~~~'))
+        if fence and not in_fence:
+            runs.append((False, run))
+            run = [line]
+        elif fence:
+            runs.append((True, run + [line]))
+            run = []
+        else:
+            run.append(line)
+        if fence:
+            in_fence = not in_fence
+    runs.append((in_fence, run))
+    return [(is_code, "\n".join(lines)) for is_code, lines in runs if lines]
+
+def _strip_prose_noise(text):
+    text = HTML_COMMENT.sub('', text)
+    text = HTML_BLOCK.sub('', text)
+    text = BADGE_LINK.sub('', text)
+    text = IMAGE.sub('', text)
+    text = LINK_DEFINITION.sub('', text)
+    text = HTML_TAG.sub('', text)
+    lines = []
+    for line in text.splitlines():
+        # Language switchers and link bars: mostly links, little prose.
+        links = MARKDOWN_LINK.findall(line)
+        if len(links) >= 3 and len(MARKDOWN_LINK.sub('', line).strip(' |·•-')) < 10:
+            continue
+        lines.append(line.rstrip())
+    return re.sub(r'\n{3,}', '\n\n', "\n".join(lines)).strip()
+
+def _strip_noise(text):
+    # Code blocks are kept verbatim: <placeholders>, generics and JSX in
+    # install and usage snippets look like HTML tags.
+    parts = [code if is_code else _strip_prose_noise(code) for is_code, code in _split_fences(text)]
+    return "\n\n".join(part for part in parts if part.strip()).strip()
+
+def _split_sections(text):
+    """Split Markdown into (heading, body) pairs at headings outside code."""
+    sections, heading, body, in_fence = [], '', [], False
+    for line in text.splitlines():
+        if line.lstrip().startswith(('```', '~~~')):
+            in_fence = not in_fence
+        match = None if in_fence else HEADING.match(line)
+        if match:
+            sections.append((heading, "\n".join(body)))
+            heading, body = line, []
+        else:
+            body.append(line)
+    sections.append((heading, "\n".join(body)))
+    return [(h, b.strip()) for h, b in sections if h or b.strip()]
+
+def _dedupe_code_blocks(body, seen):
+    out, block, in_fence = [], [], False
+    for line in body.splitlines():
+        if line.lstrip().startswith(('```', '~~~')):
+            if in_fence:
+                block.append(line)
+                key = hashlib.sha1("\n".join(l.strip() for l in block[1:-1]).encode('utf-8')).hexdigest()
+                if key not in seen:
+                    seen.add(key)
+                    out.extend(block)
+                block = []
+            else:
+                block = [line]
+            in_fence = not in_fence
+        elif in_fence:
+            block.append(line)
+        else:
+            out.append(line)
+    return "\n".join(out + block)
+
+def _section_priorities(sections):
+    """Rank sections by heading keywords; subsections inherit their parent's rank."""
+    priorities, parents = [], []
+    for index, (heading, _) in enumerate(sections):
+        level = len(heading) - len(heading.lstrip('#'))
+        while parents and parents[-1][0] >= level:
+            parents.pop()
+        title = heading.lstrip('#').strip().lower()
+        priority = next((p for p, keywords in SECTION_PRIORITIES if any(k in title for k in keywords)), None)
+        if index == 0:
+            priority = 3  # title and introduction
+        elif priority is None:
+            # The first section is the title, so only inherit from real sections.
+            priority = parents[-1][1] if parents and parents[-1][2] != 0 else 1
+        priorities.append(priority)
+        parents.append((level, priority, index))
+    return priorities
+
+def build_readme_context(readme, budget=None):
+    """Reduce a README to its most useful sections within a token budget."""
+    budget = budget or README_TOKEN_BUDGET
+    cleaned = _strip_noise(readme or '')
+    if not cleaned:
+        return fit_to_budget(readme or '', budget)
+    seen_code = set()
+    sections = [(heading, _dedupe_code_blocks(body, seen_code))
+                for heading, body in _split_sections(cleaned)]
+    priorities = _section_priorities(sections)
+    ranked = sorted(range(len(sections)), key=lambda i: (-priorities[i], i))
+    remaining, chosen = budget, {}
+    for i in ranked:
+        if priorities[i] < 0:
+            break  # licenses, contributor lists, translations and the like
+        heading, body = sections[i]
+        text = f"{heading}\n{body}".strip()
+        cost = estimate_tokens(text) + 1
+        if cost <= remaining:
+            chosen[i] = text
+            remaining -= cost
+        elif remaining > 50:
+            chosen[i] = fit_to_budget(text, remaining - 1)
+            remaining = 0
+        if remaining <= 0:
+            break
+    return "\n\n".join(chosen[i] for i in sorted(chosen))
+
+def tree_context(tree):
+    return fit_to_budget(tree.summary(), TREE_TOKEN_BUDGET)
+
+def fetch_readme_context(owner, repo_name, prompt_tokens, ref=None):
+    """Fetch the README and reduce it for prompting, recording token counts."""
+    readme, error = get_github_readme(owner, repo_name, ref)
+    if error:
+        return None, error
+    context = build_readme_context(readme)
+    prompt_tokens['readme'] = {'before': estimate_tokens(readme), 'after': estimate_tokens(context)}
+    return context, None
+
+def fetch_tree_index(owner, repo_name, ref, prompt_tokens):
+    tree, error = get_github_tree(owner, repo_name, ref)
+    if error:
+        return None, error
+    prompt_tokens['tree'] = {'before': estimate_tokens(tree.summary()), 'after': estimate_tokens(tree_context(tree))}
+    return tree, None
 
 # --- Helper Functions ---
 def parse_github_url(url):
@@ -128,11 +1270,11 @@ def parse_github_url(url):
         return match.group(1), match.group(2).strip()
     return None, None
 
-def get_github_readme(owner, repo_name):
-    url = f"https://api.github.com/repos/{owner}/{repo_name}/readme"
-    headers = {"Authorization": f"Bearer {GITHUB_TOKEN}", "Accept": "application/vnd.github.v3+json"}
+def get_github_readme(owner, repo_name, ref=None):
+    """The README at ref, so it matches the tree it is analyzed with, else the default branch's."""
+    path = f"/repos/{owner}/{repo_name}/readme" + (f"?ref={ref}" if ref else "")
     try:
-        response = requests.get(url, headers=headers, timeout=15)
+        response = github.get(path, timeout=15)
         response.raise_for_status()
         content = base64.b64decode(response.json()['content']).decode('utf-8')
         return content, None
@@ -141,52 +1283,1120 @@ def get_github_readme(owner, repo_name):
     except Exception as e:
         return None, f"An unexpected error occurred: {e}"
 
+# Resolved heads are reused for HEAD_SHA_TTL seconds, so cache hits on
+# popular repos are served without a GitHub round trip; a push shows up once
+# the entry expires.
+HEAD_SHA_TTL = float(os.getenv('HEAD_SHA_TTL', 30))
+head_sha_cache = LRUCache(int(os.getenv('HEAD_SHA_CACHE_MAX_ENTRIES', 10000)))
+
+def get_github_head_sha(owner, repo_name):
+    key = (owner.lower(), repo_name.lower())
+    cached = head_sha_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        record_cache('head_sha', 'hit')
+        return cached[1], None
+    record_cache('head_sha', 'miss')
+    try:
+        response = github.get(f"/repos/{owner}/{repo_name}/commits/HEAD", accept="application/vnd.github.sha", timeout=10)
+        response.raise_for_status()
+        head_sha = response.text.strip()
+        head_sha_cache.set(key, (time.monotonic() + HEAD_SHA_TTL, head_sha))
+        return head_sha, None
+    except requests.exceptions.HTTPError as err:
+        return None, f"Could not resolve default branch head. (HTTP Error: {err.response.status_code})"
+    except Exception as e:
+        return None, f"An unexpected error occurred: {e}"
+
+def summary_prompt(readme_content):
+    return f"Summarize the following README in concise bullet points. Include:\n- Main project purpose (1 bullet)\n- 2-4 key features (bullets)\n- Main technologies (bullets)\nIf there are any code examples, show the most important one as a code snippet.\nFormat your response in Markdown.\n---\n{readme_content}"
+
+def structure_prompt(file_structure):
+    return f"Based only on the file structure below, provide:\n- Project type and likely architecture (1 bullet)\n- 2-4 main components or folders (bullets)\n- Any special scripts or config files (bullets)\nIf you see a main entry point or config, show a code snippet of its filename.\nFormat your response in Markdown.\n---\n{file_structure}"
+
+def setup_guide_prompt(readme, file_structure):
+    return f"Write a brief, step-by-step setup guide for this project as bullet points.\n- List required tools\n- Show install commands as code snippets\n- Show run/test commands as code snippets\n- Mention any .env or config setup if needed\nFormat your response in Markdown.\n---README---\n{readme}\n---FILE STRUCTURE---\n{file_structure}"
+
+def generate_with_gemini(prompt_type, prompt, **kwargs):
+    """model.generate_content with latency and token metrics."""
+    check_cancelled()
+    metrics.inc('codeatlas_gemini_input_tokens_total', (('prompt', prompt_type),), estimate_tokens(prompt))
+    # Bound the call itself, so an abandoned stage frees its pool thread.
+    kwargs.setdefault('request_options', {'timeout': GEMINI_STAGE_TIMEOUT})
+    started = time.perf_counter()
+    status = 'error'
+    try:
+        response = get_model().generate_content(prompt, **kwargs)
+        status = 'ok'
+        return response
+    finally:
+        record_upstream('gemini', prompt_type, status, time.perf_counter() - started)
+
+# The combined mode sends the README and tree once and asks for all three
+# sections as schema-constrained JSON, halving input tokens and saving two
+# round trips. Any failure falls back to the per-section prompts.
+ANALYSIS_MODES = ('split', 'combined')
+ANALYSIS_MODE = os.getenv('ANALYSIS_MODE', 'split')
+COMBINED_SECTIONS = ('readme_summary', 'structure_analysis', 'setup_guide')
+COMBINED_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {section: {"type": "string"} for section in COMBINED_SECTIONS},
+    "required": list(COMBINED_SECTIONS),
+}
+
+def combined_analysis_prompt(readme, file_structure):
+    return ("Analyze the repository described by the README and file structure below. Respond with a JSON object "
+            "with three Markdown string fields:\n"
+            "- readme_summary: concise bullet points with the main project purpose (1 bullet), 2-4 key features and "
+            "the main technologies; if there are code examples, include the most important one as a code snippet.\n"
+            "- structure_analysis: based only on the file structure, the project type and likely architecture "
+            "(1 bullet), 2-4 main components or folders, and any special scripts or config files; if you see a main "
+            "entry point or config, show its filename as a code snippet.\n"
+            "- setup_guide: a brief step-by-step setup guide as bullet points listing required tools, install "
+            "commands and run/test commands as code snippets, and any .env or config setup if needed.\n"
+            f"---README---\n{readme}\n---FILE STRUCTURE---\n{file_structure}")
+
+def parse_combined_response(text):
+    """Validate a combined-mode JSON response. Returns (sections, error)."""
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError) as e:
+        return None, f"Combined response is not valid JSON: {e}"
+    if not isinstance(data, dict):
+        return None, "Combined response is not a JSON object"
+    missing = [s for s in COMBINED_SECTIONS if not isinstance(data.get(s), str) or not data[s].strip()]
+    if missing:
+        return None, f"Combined response is missing {', '.join(missing)}"
+    return {section: render_markdown(data[section]) for section in COMBINED_SECTIONS}, None
+
+def analyze_combined_with_gemini(readme, file_structure):
+    if not readme or not file_structure:
+        return None, "README or file structure is empty."
+    prompt = combined_analysis_prompt(readme, file_structure)
+    try:
+        response = generate_with_gemini('combined', prompt, generation_config={
+            "response_mime_type": "application/json",
+            "response_schema": COMBINED_RESPONSE_SCHEMA,
+        })
+        return parse_combined_response(response.text)
+    except Exception as e:
+        return None, f"Error generating combined analysis: {e}"
+
 def summarize_readme_with_gemini(readme_content):
     if not readme_content:
         return None, "README content is empty."
-    prompt = f"Summarize the following README in concise bullet points. Include:\n- Main project purpose (1 bullet)\n- 2-4 key features (bullets)\n- Main technologies (bullets)\nIf there are any code examples, show the most important one as a code snippet.\nFormat your response in Markdown.\n---\n{readme_content}"
+    prompt = summary_prompt(readme_content)
     try:
-        response = model.generate_content(prompt)
-        return markdown(response.text), None
+        response = generate_with_gemini('readme_summary', prompt)
+        return render_markdown(response.text), None
     except Exception as e:
         return None, f"Error generating summary: {e}"
 
-def get_github_file_structure(owner, repo_name):
-    repo_url = f"https://api.github.com/repos/{owner}/{repo_name}"
-    headers = {"Authorization": f"Bearer {GITHUB_TOKEN}", "Accept": "application/vnd.github.v3+json"}
-    try:
-        repo_info = requests.get(repo_url, headers=headers, timeout=10)
-        repo_info.raise_for_status()
-        default_branch = repo_info.json()['default_branch']
-        tree_url = f"https://api.github.com/repos/{owner}/{repo_name}/git/trees/{default_branch}?recursive=1"
-        tree_response = requests.get(tree_url, headers=headers, timeout=15)
-        tree_response.raise_for_status()
-        files = [item['path'] for item in tree_response.json()['tree'] if item['type'] == 'blob']
-        return "\n".join(files[:200]), None
+def get_github_tree(owner, repo_name, ref=None):
+    """Index the repository tree at ref (default branch when omitted).
+
+    The recursive tree is parsed as it streams in. When GitHub truncates it,
+    the top-level subtrees are fetched in parallel instead.
+    """
+    try:
+        if not ref:
+            repo_info = github.get(f"/repos/{owner}/{repo_name}", timeout=10)
+            repo_info.raise_for_status()
+            ref = repo_info.json()['default_branch']
+        index = TreeIndex()
+        truncated = _stream_tree_into(index, f"/repos/{owner}/{repo_name}/git/trees/{ref}?recursive=1")
+        if truncated:
+            index = _index_tree_by_subtrees(owner, repo_name, ref)
+        return index, None
     except Exception as e:
         return None, f"Could not fetch file structure: {e}"
 
 def analyze_structure_with_gemini(file_structure):
     if not file_structure:
         return None, "File structure is empty."
-    prompt = f"Based only on the file structure below, provide:\n- Project type and likely architecture (1 bullet)\n- 2-4 main components or folders (bullets)\n- Any special scripts or config files (bullets)\nIf you see a main entry point or config, show a code snippet of its filename.\nFormat your response in Markdown.\n---\n{file_structure}"
+    prompt = structure_prompt(file_structure)
     try:
-        response = model.generate_content(prompt)
-        return markdown(response.text), None
+        response = generate_with_gemini('structure_analysis', prompt)
+        return render_markdown(response.text), None
     except Exception as e:
         return None, f"Error generating analysis: {e}"
 
 def get_setup_guide_with_gemini(readme, file_structure):
-    prompt = f"Write a brief, step-by-step setup guide for this project as bullet points.\n- List required tools\n- Show install commands as code snippets\n- Show run/test commands as code snippets\n- Mention any .env or config setup if needed\nFormat your response in Markdown.\n---README---\n{readme}\n---FILE STRUCTURE---\n{file_structure}"
+    prompt = setup_guide_prompt(readme, file_structure)
     try:
-        response = model.generate_content(prompt)
-        return markdown(response.text), None
+        response = generate_with_gemini('setup_guide', prompt)
+        return render_markdown(response.text), None
     except Exception as e:
         return None, f"Error generating setup guide: {e}"
 
 
+# --- Analysis Pipeline ---
+# Stages run on a shared, bounded pool as soon as the stages they depend on
+# have finished, so an analysis takes as long as its slowest dependency chain
+# rather than the sum of every GitHub and Gemini round trip. An analysis runs
+# at most three stages at once, and every request thread (WORKER_CONCURRENCY,
+# exported by gunicorn.conf.py) and job worker may be analyzing at once.
+ANALYSIS_JOB_WORKERS = int(os.getenv('ANALYSIS_JOB_WORKERS', 4))
+ANALYSIS_MAX_WORKERS = int(os.getenv('ANALYSIS_MAX_WORKERS',
+                                     min(256, 3 * (int(os.getenv('WORKER_CONCURRENCY', 8)) + ANALYSIS_JOB_WORKERS))))
+GITHUB_STAGE_TIMEOUT = float(os.getenv('GITHUB_STAGE_TIMEOUT', 30))
+GEMINI_STAGE_TIMEOUT = float(os.getenv('GEMINI_STAGE_TIMEOUT', 120))
+STAGE_POLL_INTERVAL = 0.5
+
+analysis_executor = ThreadPoolExecutor(max_workers=ANALYSIS_MAX_WORKERS, thread_name_prefix='analysis')
+
+# func receives the results of its deps and returns a (value, error) tuple,
+# like the helper functions above.
+PipelineStage = namedtuple('PipelineStage', 'name deps func timeout')
+
+# The cancel event of the pipeline whose stage the current thread is running.
+# Helpers call check_cancelled() between GitHub and Gemini calls so aborted
+# stages stop early instead of holding a pool thread.
+stage_context = threading.local()
+
+class StageCancelled(Exception):
+    pass
+
+def check_cancelled():
+    cancelled = getattr(stage_context, 'cancelled', None)
+    if cancelled is not None and cancelled.is_set():
+        raise StageCancelled()
+
+def _run_stage(stage, inputs, cancelled, started_at):
+    started = time.monotonic()
+    started_at[stage.name] = started
+    stage_context.cancelled = cancelled
+    try:
+        check_cancelled()
+        value, error = stage.func(inputs)
+    except StageCancelled:
+        value, error = None, "Cancelled"
+    except Exception as e:
+        traceback.print_exc()
+        value, error = None, f"An unexpected error occurred: {e}"
+    finally:
+        stage_context.cancelled = None
+    return value, error, time.monotonic() - started
+
+def run_pipeline(stages):
+    """Run pipeline stages following their dependencies.
+
+    Returns (results, timings, error). The first stage to fail or exceed its
+    timeout (measured from when it starts running, not while it waits for a
+    pool thread) aborts the run: queued stages are cancelled and running
+    stages are signalled to stop at their next GitHub or Gemini call.
+    """
+    started = time.monotonic()
+    results, timings, error = {}, {}, None
+    pending = list(stages)
+    running = {}
+    cancelled = threading.Event()
+    started_at = {}
+
+    def launch_ready():
+        for stage in [s for s in pending if all(dep in results for dep in s.deps)]:
+            pending.remove(stage)
+            inputs = {dep: results[dep] for dep in stage.deps}
+            running[analysis_executor.submit(_run_stage, stage, inputs, cancelled, started_at)] = stage
+
+    def deadline(stage):
+        return started_at[stage.name] + stage.timeout if stage.name in started_at else None
+
+    launch_ready()
+    while running and not error:
+        deadlines = [d for d in map(deadline, running.values()) if d is not None]
+        timeout = min([STAGE_POLL_INTERVAL] + [d - time.monotonic() for d in deadlines])
+        done, _ = wait(running, timeout=max(0, timeout), return_when=FIRST_COMPLETED)
+        for future in done:
+            stage = running.pop(future)
+            value, stage_error, elapsed = future.result()
+            timings[stage.name] = round(elapsed, 3)
+            if stage_error:
+                error = stage_error
+                break
+            results[stage.name] = value
+        if not done:
+            expired = [s for s in running.values() if deadline(s) is not None and deadline(s) <= time.monotonic()]
+            if expired:
+                error = f"Stage '{expired[0].name}' timed out after {expired[0].timeout:g}s"
+        if not error:
+            launch_ready()
+
+    cancelled.set()
+    for future in running:
+        future.cancel()
+    if not error and pending:
+        error = f"Unresolvable pipeline stages: {', '.join(s.name for s in pending)}"
+    timings['total'] = round(time.monotonic() - started, 3)
+    return results, timings, error
+
+def analysis_stages(owner, repo_name, ref=None, previous=None, prompt_tokens=None, mode='split'):
+    """Build the analysis stages, reusing sections of a previous analysis.
+
+    previous is the cached result for an older head of the same repo; a
+    section is only regenerated when one of its inputs changed hash. Token
+    counts of the prompt inputs before and after budgeting are written to
+    prompt_tokens. In 'combined' mode a single structured call produces all
+    sections, and each section falls back to its own prompt if that fails.
+    """
+    previous = previous or {}
+    prompt_tokens = {} if prompt_tokens is None else prompt_tokens
+
+    def unchanged(r, *names):
+        return previous and all(input_hash(name, r[name]) == previous[f'{name}_hash'] for name in names)
+
+    def section_stage(name, deps, generate):
+        def run(r):
+            if unchanged(r, *deps):
+                return previous[name], None
+            if r.get('combined'):
+                return r['combined'][name], None
+            return generate(r)
+        return PipelineStage(name, deps + ('combined',) if mode == 'combined' else deps, run, GEMINI_STAGE_TIMEOUT)
+
+    def combined(r):
+        if unchanged(r, 'readme') or unchanged(r, 'tree'):
+            return None, None  # some sections are reusable; prompt only for the rest
+        sections, error = analyze_combined_with_gemini(r['readme'], tree_context(r['tree']))
+        if error:
+            print(f"Combined analysis of {owner}/{repo_name} failed, using per-section prompts: {error}")
+        return sections, None
+
+    stages = [
+        PipelineStage('readme', (), lambda r: fetch_readme_context(owner, repo_name, prompt_tokens, ref), GITHUB_STAGE_TIMEOUT),
+        PipelineStage('tree', (), lambda r: fetch_tree_index(owner, repo_name, ref, prompt_tokens), GITHUB_STAGE_TIMEOUT),
+        section_stage('readme_summary', ('readme',), lambda r: summarize_readme_with_gemini(r['readme'])),
+        section_stage('structure_analysis', ('tree',), lambda r: analyze_structure_with_gemini(tree_context(r['tree']))),
+        section_stage('setup_guide', ('readme', 'tree'),
+                      lambda r: get_setup_guide_with_gemini(r['readme'], tree_context(r['tree']))),
+    ]
+    if mode == 'combined':
+        stages.append(PipelineStage('combined', ('readme', 'tree'), combined, GEMINI_STAGE_TIMEOUT))
+    return stages
+
+def input_hash(name, value):
+    """Hash of a pipeline input ('readme' text or 'tree' index)."""
+    return content_hash(value.summary() if name == 'tree' else value)
+
+def _sections(results):
+    return {
+        "readme_summary": results['readme_summary'],
+        "structure_analysis": results['structure_analysis'],
+        "setup_guide": results['setup_guide'],
+        "file_structure": results['tree'].listing(),
+    }
+
+def _cache_size(result):
+    return sum(len(value) for value in result.values())
+
+def store_analysis(owner, repo_name, head_sha, results):
+    result = _sections(results)
+    analysis_lru.set((owner, repo_name, head_sha), result, _cache_size(result))
+    try:
+        db.session.add(AnalysisCache(owner=owner, repo=repo_name, head_sha=head_sha,
+                                     readme_hash=input_hash('readme', results['readme']),
+                                     tree_hash=input_hash('tree', results['tree']), **result))
+        db.session.commit()
+    except Exception as e:
+        # Most likely a concurrent analysis of the same head stored it first.
+        db.session.rollback()
+        print(f"Could not store analysis for {owner}/{repo_name}@{head_sha}: {e}")
+    prune_analyses(owner, repo_name)
+
+def prune_analyses(owner, repo_name):
+    """Drop all but the newest ANALYSIS_CACHE_HEADS_PER_REPO analyses of a repository."""
+    try:
+        stale = (AnalysisCache.query.filter_by(owner=owner, repo=repo_name)
+                 .order_by(AnalysisCache.updated_at.desc(), AnalysisCache.id.desc())
+                 .offset(ANALYSIS_CACHE_HEADS_PER_REPO).all())
+        for row in stale:
+            analysis_lru.pop((owner, repo_name, row.head_sha))
+            analysis_responses.pop((owner.lower(), repo_name.lower(), row.head_sha))
+            db.session.delete(row)
+        if stale:
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Could not prune analyses of {owner}/{repo_name}: {e}")
+
+def get_cached_analysis(owner, repo_name, head_sha):
+    key = (owner, repo_name, head_sha)
+    cached = analysis_lru.get(key)
+    if cached is not None:
+        record_analysis_cache('memory_hits')
+        return cached
+    row = AnalysisCache.query.filter_by(owner=owner, repo=repo_name, head_sha=head_sha).first()
+    if row:
+        cached = row.to_result()
+        analysis_lru.set(key, cached, _cache_size(cached))
+        record_analysis_cache('db_hits')
+    return cached
+
+def get_previous_analysis(owner, repo_name):
+    """Most recent cached analysis of any head, with its input hashes."""
+    row = (AnalysisCache.query.filter_by(owner=owner, repo=repo_name)
+           .order_by(AnalysisCache.updated_at.desc()).first())
+    if not row:
+        return None
+    return dict(row.to_result(), readme_hash=row.readme_hash, tree_hash=row.tree_hash)
+
+def _analysis_mode(results):
+    return 'combined' if results.get('combined') else 'split'
+
+def analyze_repository(owner, repo_name, mode=None):
+    """Analyze a repo, serving unchanged heads from the cache.
+
+    Returns (result, timings, error); result["cache"] is one of "hit",
+    "partial" (some sections reused from an older head) or "miss", and
+    result["mode"] says whether the combined call produced the sections.
+    """
+    started = time.monotonic()
+    mode = mode or ANALYSIS_MODE
+    owner, repo_name = owner.lower(), repo_name.lower()
+    head_sha, error = get_github_head_sha(owner, repo_name)
+    if error:
+        # Empty or inaccessible default branch: analyze without caching.
+        prompt_tokens = {}
+        results, timings, error = run_pipeline(analysis_stages(owner, repo_name, prompt_tokens=prompt_tokens, mode=mode))
+        if error:
+            return None, timings, error
+        record_analysis_cache('misses')
+        return dict(_sections(results), cache="miss", mode=_analysis_mode(results),
+                    prompt_tokens=prompt_tokens), timings, None
+
+    cached = get_cached_analysis(owner, repo_name, head_sha)
+    if cached is not None:
+        return dict(cached, cache="hit", head_sha=head_sha), {'total': round(time.monotonic() - started, 3)}, None
+
+    previous = get_previous_analysis(owner, repo_name)
+    prompt_tokens = {}
+    results, timings, error = run_pipeline(analysis_stages(owner, repo_name, head_sha, previous, prompt_tokens, mode))
+    if error:
+        return None, timings, error
+
+    outcome = "miss"
+    if previous and any(input_hash(name, results[name]) == previous[f'{name}_hash'] for name in ('readme', 'tree')):
+        outcome = "partial"
+    record_analysis_cache('partial_hits' if outcome == "partial" else 'misses')
+    store_analysis(owner, repo_name, head_sha, results)
+    timings['total'] = round(time.monotonic() - started, 3)
+    print(f"Analyzed {owner}/{repo_name}: prompt tokens {prompt_tokens}")
+    return dict(_sections(results), cache=outcome, mode=_analysis_mode(results), head_sha=head_sha,
+                prompt_tokens=prompt_tokens), timings, None
+
+# --- Trending Cache ---
+# The search API allows 30 requests a minute, and the default feed is the
+# same for everyone. Responses are cached as serialized JSON per normalized
+# query and date window. Entries past TRENDING_CACHE_TTL are served stale
+# while a background refresh runs, and the default feed is refreshed ahead
+# of expiry.
+TRENDING_CACHE_TTL = float(os.getenv('TRENDING_CACHE_TTL', 300))
+TRENDING_STALE_TTL = float(os.getenv('TRENDING_STALE_TTL', 3600))
+TRENDING_WINDOW_DAYS = 730
+
+trending_cache = LRUCache(int(os.getenv('TRENDING_CACHE_MAX_ENTRIES', 512)))
+trending_refreshing = set()
+trending_lock = threading.Lock()
+trending_prefetcher = []
+refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='refresh')
+
+def trending_cache_key(search_query):
+    normalized = ' '.join((search_query or '').lower().split())
+    since = (datetime.utcnow() - timedelta(days=TRENDING_WINDOW_DAYS)).strftime('%Y-%m-%d')
+    return normalized, since
+
+def fetch_trending(key):
+    """Run the search and cache the serialized result. Returns (entity, error)."""
+    search_query, since = key
+    q = [search_query] if search_query else []
+    q.append(f"created:>{since}")
+    query = '+'.join(q)
+    try:
+        resp = github.get(f"/search/repositories?q={query}&sort=stars&order=desc&per_page=12", timeout=15)
+        resp.raise_for_status()
+        items = resp.json().get('items', [])
+        result = [{
+            'name': r['full_name'],
+            'url': r['html_url'],
+            'stars': r['stargazers_count'],
+            'description': r['description'] or '',
+            'forks': r['forks_count'],
+        } for r in items]
+    except Exception as e:
+        return None, f"Error searching repos: {e}"
+    entity = EncodedBody(json.dumps(result).encode('utf-8'))
+    trending_cache.set(key, (entity, time.monotonic()))
+    return entity, None
+
+def _refresh_trending(key):
+    try:
+        _, error = fetch_trending(key)
+        if error:
+            print(f"Trending refresh for {key} failed: {error}")
+    finally:
+        with trending_lock:
+            trending_refreshing.discard(key)
+
+def schedule_trending_refresh(key):
+    with trending_lock:
+        if key in trending_refreshing:
+            return
+        trending_refreshing.add(key)
+    refresh_executor.submit(_refresh_trending, key)
+
+def _prefetch_default_trending():
+    while True:
+        fetch_trending(trending_cache_key(None))
+        time.sleep(TRENDING_CACHE_TTL * 0.8)
+
+def start_trending_prefetcher():
+    with trending_lock:
+        if trending_prefetcher:
+            return
+        worker = threading.Thread(target=_prefetch_default_trending, name='trending-prefetch', daemon=True)
+        worker.start()
+        trending_prefetcher.append(worker)
+
+def get_trending(search_query):
+    """Return (entity, cache_status, error) for a trending search."""
+    start_trending_prefetcher()
+    key = trending_cache_key(search_query)
+    entry = trending_cache.get(key)
+    if entry:
+        entity, fetched_at = entry
+        age = time.monotonic() - fetched_at
+        if age < TRENDING_CACHE_TTL:
+            return entity, 'HIT', None
+        if age < TRENDING_CACHE_TTL + TRENDING_STALE_TTL:
+            schedule_trending_refresh(key)
+            return entity, 'STALE', None
+    entity, error = fetch_trending(key)
+    if error and entry:
+        # Too old to serve normally, but better than an error page.
+        return entry[0], 'STALE', None
+    return entity, 'MISS', error
+
+# --- API Hub Catalog ---
+# The API hub is served from an in-memory snapshot: the bundled seed file, then
+# whatever the background refresher last fetched from API_HUB_CATALOG_URL with
+# a conditional request. A snapshot is indexed by category and serializes the
+# unfiltered responses up front, so requests never touch the upstream.
+API_HUB_SEED_PATH = os.getenv('API_HUB_SEED_PATH', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'data', 'apihub_catalog.json'))
+API_HUB_CATALOG_URL = os.getenv('API_HUB_CATALOG_URL', 'https://api.publicapis.org/entries')
+API_HUB_REFRESH_INTERVAL = float(os.getenv('API_HUB_REFRESH_INTERVAL', 6 * 3600))
+API_HUB_CORS_VALUES = ('yes', 'no', 'unknown')
+
+class ApiCatalog:
+    """Immutable snapshot of the catalog, indexed by lowercased category."""
+
+    def __init__(self, entries, etag=None, last_modified=None):
+        self.etag = etag
+        self.last_modified = last_modified
+        names = {}
+        self.by_category = {}
+        for entry in entries:
+            category = entry.get('Category')
+            if not category or not entry.get('API'):
+                continue
+            names.setdefault(category.lower(), category)
+            search_text = f"{entry['API']} {entry.get('Description') or ''}".lower()
+            self.by_category.setdefault(category.lower(), []).append((search_text, entry))
+        for indexed in self.by_category.values():
+            indexed.sort(key=lambda item: item[1]['API'].lower())
+        self.indexed = [item for key in sorted(self.by_category) for item in self.by_category[key]]
+        categories = sorted(names.values(), key=str.lower)
+        self.categories_body = json.dumps({"count": len(categories), "categories": categories}).encode('utf-8')
+        self.entries_bodies = {key: self.render(indexed) for key, indexed in self.by_category.items()}
+        self.empty_body = self.render([])
+
+    @staticmethod
+    def render(indexed):
+        return json.dumps({"count": len(indexed), "entries": [entry for _, entry in indexed]}).encode('utf-8')
+
+    def entries_body(self, category=None, auth=None, https=None, cors=None, text=None):
+        """JSON body of the entries matching every given filter."""
+        filtered = auth is not None or https is not None or cors is not None or text
+        if category and not filtered:
+            return self.entries_bodies.get(category.lower(), self.empty_body)
+        indexed = self.by_category.get(category.lower(), []) if category else self.indexed
+        if auth is not None:
+            indexed = [item for item in indexed if (item[1].get('Auth') or '').lower() == auth]
+        if https is not None:
+            indexed = [item for item in indexed if bool(item[1].get('HTTPS')) == https]
+        if cors is not None:
+            indexed = [item for item in indexed if (item[1].get('Cors') or 'unknown').lower() == cors]
+        for word in (text or '').lower().split():
+            indexed = [item for item in indexed if word in item[0]]
+        return self.render(indexed)
+
+api_catalog = None
+api_catalog_lock = threading.Lock()
+api_catalog_refresher = []
+
+def catalog_entries(data):
+    """The entry list of a publicapis-style {"count", "entries"} document."""
+    entries = data.get('entries') if isinstance(data, dict) else data
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("catalog has no entries")
+    return [entry for entry in entries if isinstance(entry, dict)]
+
+def get_api_catalog():
+    """Current snapshot, loading the bundled seed on first use."""
+    global api_catalog
+    if api_catalog is None:
+        with api_catalog_lock:
+            if api_catalog is None:
+                with open(API_HUB_SEED_PATH, encoding='utf-8') as f:
+                    api_catalog = ApiCatalog(catalog_entries(json.load(f)))
+    start_api_catalog_refresher()
+    return api_catalog
+
+def refresh_api_catalog():
+    """Refetch the upstream catalog if it changed. Returns (changed, error)."""
+    global api_catalog
+    current = get_api_catalog()
+    headers = {}
+    if current.etag:
+        headers['If-None-Match'] = current.etag
+    if current.last_modified:
+        headers['If-Modified-Since'] = current.last_modified
+    started = time.perf_counter()
+    status = 'error'
+    try:
+        resp = requests.get(API_HUB_CATALOG_URL, headers=headers, timeout=15)
+        status = resp.status_code
+        if resp.status_code == 304:
+            return False, None
+        resp.raise_for_status()
+        catalog = ApiCatalog(catalog_entries(resp.json()), resp.headers.get('ETag'), resp.headers.get('Last-Modified'))
+    except Exception as e:
+        return False, f"Error refreshing API hub catalog: {e}"
+    finally:
+        record_upstream('apihub', 'catalog', status, time.perf_counter() - started)
+    api_catalog = catalog
+    return True, None
+
+def _refresh_api_catalog_periodically():
+    while True:
+        changed, error = refresh_api_catalog()
+        if error:
+            print(error)
+        elif changed:
+            print(f"API hub catalog refreshed: {len(api_catalog.indexed)} entries")
+        time.sleep(API_HUB_REFRESH_INTERVAL)
+
+def start_api_catalog_refresher():
+    if API_HUB_REFRESH_INTERVAL <= 0:
+        return
+    with api_catalog_lock:
+        if api_catalog_refresher:
+            return
+        worker = threading.Thread(target=_refresh_api_catalog_periodically, name='apihub-refresh', daemon=True)
+        worker.start()
+        api_catalog_refresher.append(worker)
+
+# --- Analysis Jobs ---
+# Analyses submitted through /api/analyze/jobs run on a small pool of
+# background workers fed by a bounded queue. Concurrent submissions for the
+# same repo attach to the job already queued or running (singleflight), and
+# job state lives in the database. Each unfinished job is leased to the
+# process that queued it, which renews the lease while it is alive; a job
+# whose lease has expired belonged to a worker that died, and is adopted by
+# whichever process notices it first.
+ANALYSIS_JOB_QUEUE_SIZE = int(os.getenv('ANALYSIS_JOB_QUEUE_SIZE', 100))
+ANALYSIS_JOB_LEASE = float(os.getenv('ANALYSIS_JOB_LEASE', 60))
+UNFINISHED_JOB_STATUSES = ('queued', 'running')
+
+analysis_job_queue = queue.Queue(maxsize=ANALYSIS_JOB_QUEUE_SIZE)
+inflight_jobs = {}
+inflight_jobs_lock = threading.Lock()
+job_workers = []
+
+class JobQueueFull(Exception):
+    pass
+
+def job_worker_id():
+    """Identifies this process as a job owner; the pid changes in forked workers."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _lease_expiry():
+    return datetime.utcnow() + timedelta(seconds=ANALYSIS_JOB_LEASE)
+
+def _lease_expired():
+    return db.or_(AnalysisJob.lease_expires_at.is_(None), AnalysisJob.lease_expires_at < datetime.utcnow())
+
+def _claim_job(job_id, status, claimable):
+    """Take a job with a conditional UPDATE; False if another process holds it."""
+    claimed = (AnalysisJob.query.filter(AnalysisJob.id == job_id, claimable)
+               .update({'status': status, 'worker': job_worker_id(), 'lease_expires_at': _lease_expiry()},
+                       synchronize_session=False))
+    db.session.commit()
+    return claimed == 1
+
+def run_analysis_job(job_id):
+    me = job_worker_id()
+    queued_here = db.and_(AnalysisJob.status == 'queued', AnalysisJob.worker == me)
+    abandoned = db.and_(AnalysisJob.status.in_(UNFINISHED_JOB_STATUSES), _lease_expired())
+    if not _claim_job(job_id, 'running', db.or_(queued_here, abandoned)):
+        return
+    job = db.session.get(AnalysisJob, job_id)
+    try:
+        result, timings, error = analyze_repository(job.owner, job.repo)
+    except Exception as e:
+        traceback.print_exc()
+        result, timings, error = None, {}, f"An unexpected error occurred: {e}"
+    # Only the lease holder records the outcome, in case the job was adopted
+    # after this process stalled past its lease.
+    (AnalysisJob.query.filter_by(id=job_id, worker=me, status='running')
+     .update({'status': 'failed' if error else 'succeeded', 'error': error,
+              'result': json.dumps(result) if result else None, 'timings': json.dumps(timings),
+              'lease_expires_at': None}, synchronize_session=False))
+    db.session.commit()
+
+def _analysis_job_worker(app):
+    while True:
+        job_id, key = analysis_job_queue.get()
+        try:
+            with app.app_context():
+                run_analysis_job(job_id)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            with inflight_jobs_lock:
+                if inflight_jobs.get(key) == job_id:
+                    del inflight_jobs[key]
+            analysis_job_queue.task_done()
+
+def _enqueue_job(job):
+    """Queue a job this process has claimed. Caller holds inflight_jobs_lock."""
+    key = (job.owner, job.repo)
+    inflight_jobs[key] = job.id
+    analysis_job_queue.put_nowait((job.id, key))
+
+def adopt_abandoned_jobs():
+    """Queue unfinished jobs whose owner stopped renewing their lease."""
+    adopted = 0
+    with inflight_jobs_lock:
+        abandoned = (AnalysisJob.query.filter(AnalysisJob.status.in_(UNFINISHED_JOB_STATUSES), _lease_expired())
+                     .order_by(AnalysisJob.created_at).all())
+        for job in abandoned:
+            if analysis_job_queue.full():
+                break
+            if (job.owner, job.repo) in inflight_jobs:
+                continue
+            claimable = db.and_(AnalysisJob.status.in_(UNFINISHED_JOB_STATUSES), _lease_expired())
+            if _claim_job(job.id, 'queued', claimable):
+                _enqueue_job(job)
+                adopted += 1
+    if adopted:
+        print(f"Resumed {adopted} abandoned analysis jobs")
+
+def renew_job_leases():
+    """Extend the lease on every unfinished job this process owns."""
+    (AnalysisJob.query.filter(AnalysisJob.worker == job_worker_id(),
+                              AnalysisJob.status.in_(UNFINISHED_JOB_STATUSES))
+     .update({'lease_expires_at': _lease_expiry()}, synchronize_session=False))
+    db.session.commit()
+
+def _job_lease_keeper(app):
+    while True:
+        try:
+            with app.app_context():
+                renew_job_leases()
+                adopt_abandoned_jobs()
+        except Exception:
+            traceback.print_exc()
+        time.sleep(ANALYSIS_JOB_LEASE / 3)
+
+def start_job_workers(app=None):
+    """Start the worker threads and the lease keeper, once per process.
+
+    gunicorn.conf.py calls this when a worker boots so jobs left behind by a
+    previous worker resume without waiting for a new submission; the job
+    routes call it too for servers without that hook.
+    """
+    with inflight_jobs_lock:
+        if job_workers:
+            return
+        app = app or current_app._get_current_object()
+        for i in range(ANALYSIS_JOB_WORKERS):
+            worker = threading.Thread(target=_analysis_job_worker, args=(app,), name=f'analysis-job-{i}', daemon=True)
+            worker.start()
+            job_workers.append(worker)
+        # Its first pass adopts jobs left behind by workers that died.
+        keeper = threading.Thread(target=_job_lease_keeper, args=(app,), name='analysis-job-lease', daemon=True)
+        keeper.start()
+        job_workers.append(keeper)
+
+def submit_analysis_job(owner, repo_name):
+    """Queue an analysis, or return the unfinished job for the same repo.
+
+    Returns (job, deduplicated). Raises JobQueueFull when the queue is at
+    capacity.
+    """
+    start_job_workers()
+    key = (owner.lower(), repo_name.lower())
+    with inflight_jobs_lock:
+        job_id = inflight_jobs.get(key)
+        job = db.session.get(AnalysisJob, job_id) if job_id else None
+        if job is None:
+            # Another process may already be running this repo.
+            job = (AnalysisJob.query.filter_by(owner=key[0], repo=key[1])
+                   .filter(AnalysisJob.status.in_(UNFINISHED_JOB_STATUSES))
+                   .order_by(AnalysisJob.created_at.desc()).first())
+        if job is not None and job.lease_expires_at and job.lease_expires_at > datetime.utcnow():
+            return job, True
+        if analysis_job_queue.full():
+            raise JobQueueFull()
+        if job is not None:
+            # Its owner died; take the job over so pollers keep their job_id.
+            claimable = db.and_(AnalysisJob.status.in_(UNFINISHED_JOB_STATUSES), _lease_expired())
+            if not _claim_job(job.id, 'queued', claimable):
+                return db.session.get(AnalysisJob, job.id), True
+            db.session.refresh(job)
+            _enqueue_job(job)
+            return job, True
+        job = AnalysisJob(owner=key[0], repo=key[1], worker=job_worker_id(), lease_expires_at=_lease_expiry())
+        db.session.add(job)
+        db.session.commit()
+        _enqueue_job(job)
+        return job, False
+
+def drain_analysis_jobs(timeout):
+    """Wait up to timeout seconds for this process's queued jobs to finish.
+
+    Called when a worker shuts down. Jobs still unfinished keep their status
+    in the database; once their lease runs out another worker adopts them.
+    """
+    deadline = time.monotonic() + timeout
+    while analysis_job_queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.1)
+    remaining = analysis_job_queue.unfinished_tasks
+    if remaining:
+        print(f"Shutting down with {remaining} analysis jobs left for the next worker")
+    return remaining == 0
+
+# --- Streaming Analysis ---
+class IncrementalMarkdown:
+    """Render streamed Markdown one completed block at a time.
+
+    A block is complete at a blank line outside a fenced code block, so each
+    fragment can be rendered on its own and appended by the client.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self._rendered = 0
+
+    def feed(self, delta):
+        self.text += delta
+        pending = self.text[self._rendered:]
+        cut = None
+        in_fence = False
+        offset = 0
+        for line in pending.splitlines(keepends=True):
+            if line.lstrip().startswith(('```', '~~~')):
+                in_fence = not in_fence
+            offset += len(line)
+            if not in_fence and not line.strip() and line.endswith('\n') and offset < len(pending):
+                cut = offset
+        if cut is None:
+            return ''
+        self._rendered += cut
+        return render_markdown(pending[:cut])
+
+    def flush(self):
+        pending = self.text[self._rendered:]
+        self._rendered = len(self.text)
+        return render_markdown(pending) if pending.strip() else ''
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _fetch_input(events, name, func):
+    started = time.monotonic()
+    try:
+        value, error = func()
+    except Exception as e:
+        value, error = None, f"An unexpected error occurred: {e}"
+    events.put(('input', name, value, error, time.monotonic() - started))
+
+def _stream_section(events, cancelled, section, prompt):
+    started = time.monotonic()
+    status = 'error'
+    metrics.inc('codeatlas_gemini_input_tokens_total', (('prompt', section),), estimate_tokens(prompt))
+    try:
+        for chunk in get_model().generate_content(prompt, stream=True):
+            if cancelled.is_set():
+                status = 'cancelled'
+                return
+            if chunk.text:
+                events.put(('delta', section, chunk.text))
+        status = 'ok'
+        events.put(('section', section, None, time.monotonic() - started))
+    except Exception as e:
+        events.put(('section', section, f"Error generating {section.replace('_', ' ')}: {e}", time.monotonic() - started))
+    finally:
+        record_upstream('gemini', f'{section}_stream', status, time.monotonic() - started)
+
+def stream_analysis(owner, repo_name):
+    """Yield Server-Sent Events for an analysis as its parts become ready.
+
+    Events: file_structure once the tree arrives, delta (raw text plus newly
+    completed HTML blocks) while Gemini streams a section, section when a
+    section is complete, then done with timings or a single error event.
+    """
+    started = time.monotonic()
+    owner, repo_name = owner.lower(), repo_name.lower()
+    yield sse_event('start', {"repo": f"{owner}/{repo_name}"})
+
+    head_sha, error = get_github_head_sha(owner, repo_name)
+    previous = None
+    if not error:
+        cached = get_cached_analysis(owner, repo_name, head_sha)
+        if cached is not None:
+            yield sse_event('file_structure', {"file_structure": cached['file_structure']})
+            for section in ('readme_summary', 'structure_analysis', 'setup_guide'):
+                yield sse_event('section', {"section": section, "html": cached[section]})
+            yield sse_event('done', {"cache": "hit", "timings": {'total': round(time.monotonic() - started, 3)}})
+            return
+        previous = get_previous_analysis(owner, repo_name)
+
+    events = queue.Queue()
+    cancelled = threading.Event()
+    inputs, sections, renderers, timings = {}, {}, {}, {}
+    prompt_tokens = {}
+    analysis_executor.submit(_fetch_input, events, 'readme', lambda: fetch_readme_context(owner, repo_name, prompt_tokens, head_sha))
+    analysis_executor.submit(_fetch_input, events, 'tree', lambda: fetch_tree_index(owner, repo_name, head_sha, prompt_tokens))
+
+    def start_section(section, input_names, prompt):
+        if previous and all(input_hash(name, inputs[name]) == previous[f'{name}_hash'] for name in input_names):
+            events.put(('cached', section, previous[section]))
+            return
+        renderers[section] = IncrementalMarkdown()
+        analysis_executor.submit(_stream_section, events, cancelled, section, prompt)
+
+    try:
+        while len(sections) < 3:
+            try:
+                message = events.get(timeout=GEMINI_STAGE_TIMEOUT)
+            except queue.Empty:
+                yield sse_event('error', {"error": f"Analysis stalled for {GEMINI_STAGE_TIMEOUT:g}s"})
+                return
+            kind, name = message[0], message[1]
+            if kind == 'input':
+                value, error, elapsed = message[2:]
+                timings[name] = round(elapsed, 3)
+                if error:
+                    yield sse_event('error', {"error": error, "timings": timings})
+                    return
+                inputs[name] = value
+                if name == 'readme':
+                    start_section('readme_summary', ('readme',), summary_prompt(value))
+                else:
+                    yield sse_event('file_structure', {"file_structure": value.listing()})
+                    start_section('structure_analysis', ('tree',), structure_prompt(tree_context(value)))
+                if len(inputs) == 2:
+                    start_section('setup_guide', ('readme', 'tree'),
+                                  setup_guide_prompt(inputs['readme'], tree_context(inputs['tree'])))
+            elif kind == 'delta':
+                rendered = renderers[name].feed(message[2])
+                yield sse_event('delta', {"section": name, "text": message[2], "html": rendered})
+            elif kind == 'cached':
+                sections[name] = message[2]
+                timings[name] = 0.0
+                yield sse_event('section', {"section": name, "html": message[2], "cached": True})
+            else:
+                error, elapsed = message[2:]
+                timings[name] = round(elapsed, 3)
+                if error:
+                    yield sse_event('error', {"error": error, "timings": timings})
+                    return
+                renderer = renderers[name]
+                tail = renderer.flush()
+                if tail:
+                    yield sse_event('delta', {"section": name, "text": '', "html": tail})
+                sections[name] = render_markdown(renderer.text)
+                yield sse_event('section', {"section": name, "html": sections[name]})
+    finally:
+        cancelled.set()
+
+    outcome = "partial" if len(renderers) < 3 and previous else "miss"
+    record_analysis_cache('partial_hits' if outcome == "partial" else 'misses')
+    if head_sha:
+        store_analysis(owner, repo_name, head_sha, dict(sections, **inputs))
+    timings['total'] = round(time.monotonic() - started, 3)
+    yield sse_event('done', {"cache": outcome, "timings": timings, "prompt_tokens": prompt_tokens})
+
+
+# --- Pagination ---
+POSTS_PAGE_SIZE = int(os.getenv('POSTS_PAGE_SIZE', 50))
+MAX_POSTS_PAGE_SIZE = 200
+COMMENTS_PAGE_SIZE = int(os.getenv('COMMENTS_PAGE_SIZE', 100))
+MAX_COMMENTS_PAGE_SIZE = 500
+MAX_BATCH_POST_IDS = 100
+MAX_COMMENTS_PER_POST = 50
+
+def parse_limit(value, default, maximum):
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, maximum)
+
+def format_cursor(timestamp, row_id):
+    return f"{timestamp.isoformat()},{row_id}"
+
+def parse_cursor(value):
+    """Parse a '<ISO timestamp>,<id>' keyset cursor, or None if absent."""
+    if not value:
+        return None
+    try:
+        timestamp, row_id = value.rsplit(',', 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except ValueError:
+        raise ValueError("Invalid cursor, expected '<timestamp>,<id>'")
+
+
+# --- Full-Text Search ---
+# SQLite keeps external-content FTS5 tables over post and comment, synced by
+# triggers, so add_post/add_comment and every other write update the index in
+# the same transaction. Postgres uses GIN indexes on the tsvector expressions
+# below; queries repeat the exact expressions so the planner can use them.
+SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', 20))
+MAX_SEARCH_PAGE_SIZE = 100
+MAX_SEARCH_OFFSET = 1000
+MAX_SEARCH_TERMS = 8
+SEARCH_TYPES = ('posts', 'comments')
+# Snippet delimiters, swapped for <mark> tags after the text is escaped.
+MATCH_START, MATCH_END = '\x02', '\x03'
+
+POST_TSVECTOR = "setweight(to_tsvector('english', repo_name), 'A') || setweight(to_tsvector('english', idea), 'B')"
+COMMENT_TSVECTOR = "to_tsvector('english', text)"
+TS_HEADLINE_OPTIONS = f"StartSel={MATCH_START}, StopSel={MATCH_END}, MaxWords=24, MinWords=8, MaxFragments=2"
+
+SQLITE_SEARCH_SCHEMA = {
+    'post_fts': [
+        "CREATE VIRTUAL TABLE post_fts USING fts5(repo_name, idea, content='post', content_rowid='id', "
+        "tokenize='porter unicode61')",
+        # Matches in repo_name weigh twice as much as matches in the idea.
+        "INSERT INTO post_fts(post_fts, rank) VALUES ('rank', 'bm25(2.0, 1.0)')",
+        "INSERT INTO post_fts(post_fts) VALUES ('rebuild')",
+    ],
+    'comment_fts': [
+        "CREATE VIRTUAL TABLE comment_fts USING fts5(text, content='comment', content_rowid='id', "
+        "tokenize='porter unicode61')",
+        "INSERT INTO comment_fts(comment_fts) VALUES ('rebuild')",
+    ],
+}
+SQLITE_SEARCH_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS post_fts_insert AFTER INSERT ON post BEGIN
+        INSERT INTO post_fts(rowid, repo_name, idea) VALUES (new.id, new.repo_name, new.idea);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS post_fts_delete AFTER DELETE ON post BEGIN
+        INSERT INTO post_fts(post_fts, rowid, repo_name, idea) VALUES ('delete', old.id, old.repo_name, old.idea);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS post_fts_update AFTER UPDATE ON post BEGIN
+        INSERT INTO post_fts(post_fts, rowid, repo_name, idea) VALUES ('delete', old.id, old.repo_name, old.idea);
+        INSERT INTO post_fts(rowid, repo_name, idea) VALUES (new.id, new.repo_name, new.idea);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comment_fts_insert AFTER INSERT ON comment BEGIN
+        INSERT INTO comment_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comment_fts_delete AFTER DELETE ON comment BEGIN
+        INSERT INTO comment_fts(comment_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS comment_fts_update AFTER UPDATE ON comment BEGIN
+        INSERT INTO comment_fts(comment_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO comment_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+]
+POSTGRES_SEARCH_SCHEMA = [
+    f"CREATE INDEX IF NOT EXISTS ix_post_search ON post USING GIN (({POST_TSVECTOR}))",
+    f"CREATE INDEX IF NOT EXISTS ix_comment_search ON comment USING GIN (({COMMENT_TSVECTOR}))",
+]
+
+SEARCH_QUERIES = {
+    ('sqlite', 'posts'): """
+        SELECT post.id, post.repo_name, post.timestamp,
+               snippet(post_fts, 1, :start, :end, '…', 24) AS snippet, -post_fts.rank AS score
+        FROM post_fts JOIN post ON post.id = post_fts.rowid
+        WHERE post_fts MATCH :query
+        ORDER BY post_fts.rank LIMIT :limit OFFSET :offset""",
+    ('sqlite', 'comments'): """
+        SELECT comment.id, comment.post_id, post.repo_name, comment.timestamp,
+               snippet(comment_fts, 0, :start, :end, '…', 24) AS snippet, -comment_fts.rank AS score
+        FROM comment_fts JOIN comment ON comment.id = comment_fts.rowid JOIN post ON post.id = comment.post_id
+        WHERE comment_fts MATCH :query
+        ORDER BY comment_fts.rank LIMIT :limit OFFSET :offset""",
+    ('postgresql', 'posts'): f"""
+        SELECT post.id, post.repo_name, post.timestamp,
+               ts_headline('english', idea, query, :options) AS snippet,
+               ts_rank({POST_TSVECTOR}, query) AS score
+        FROM post, to_tsquery('english', :query) AS query
+        WHERE ({POST_TSVECTOR}) @@ query
+        ORDER BY score DESC, post.id DESC LIMIT :limit OFFSET :offset""",
+    ('postgresql', 'comments'): f"""
+        SELECT comment.id, comment.post_id, post.repo_name, comment.timestamp,
+               ts_headline('english', text, query, :options) AS snippet,
+               ts_rank({COMMENT_TSVECTOR}, query) AS score
+        FROM comment JOIN post ON post.id = comment.post_id, to_tsquery('english', :query) AS query
+        WHERE ({COMMENT_TSVECTOR}) @@ query
+        ORDER BY score DESC, comment.id DESC LIMIT :limit OFFSET :offset""",
+}
+
+def create_search_index():
+    """Create the full-text index for the current database, if supported."""
+    dialect = db.engine.dialect.name
+    with db.engine.begin() as conn:
+        if dialect == 'sqlite':
+            existing = {row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for table, statements in SQLITE_SEARCH_SCHEMA.items():
+                if table not in existing:
+                    for statement in statements:
+                        conn.exec_driver_sql(statement)
+            for statement in SQLITE_SEARCH_TRIGGERS:
+                conn.exec_driver_sql(statement)
+        elif dialect == 'postgresql':
+            for statement in POSTGRES_SEARCH_SCHEMA:
+                conn.exec_driver_sql(statement)
+        else:
+            print(f"⚠️ Full-text search is not available on {dialect}")
+
+def search_terms(text):
+    """Words of a free-text query; punctuation never reaches the query syntax."""
+    return re.findall(r'\w+', text.lower())[:MAX_SEARCH_TERMS]
+
+def full_text_query(dialect, terms):
+    """All terms must match; the last one also matches as a prefix."""
+    if dialect == 'sqlite':
+        return ' '.join(f'"{term}"' for term in terms) + '*'
+    return ' & '.join(terms) + ':*'
+
+def highlight(snippet):
+    return html.escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+
+def search(search_type, text, limit, offset):
+    """Return (rows, error) for one page of ranked matches, best first."""
+    dialect = db.engine.dialect.name
+    sql = SEARCH_QUERIES.get((dialect, search_type))
+    if sql is None:
+        return None, f"Search is not available on {dialect}"
+    terms = search_terms(text)
+    if not terms:
+        return [], None
+    rows = db.session.execute(db.text(sql).columns(timestamp=db.DateTime), {
+        'query': full_text_query(dialect, terms), 'limit': limit, 'offset': offset,
+        'start': MATCH_START, 'end': MATCH_END, 'options': TS_HEADLINE_OPTIONS,
+    }).mappings().all()
+    return rows, None
+
 # --- Auth Routes ---
-@app.route('/api/register', methods=['POST'])
+@api.route('/api/register', methods=['POST'])
 def register():
     try:
         data = request.get_json()
@@ -207,35 +2417,47 @@ def register():
         db.session.add(new_user)
         db.session.commit()
         return jsonify({"message": "User registered successfully"}), 201
+    except PasswordHashBusy:
+        return jsonify({"error": "Server is busy, please retry shortly"}), 503
+    except IntegrityError:
+        # Lost a race with a concurrent registration for the same username.
+        db.session.rollback()
+        return jsonify({"error": "Username already exists"}), 400
     except Exception as e:
         print("Registration error:", e)
         traceback.print_exc()  # 🔹 Full error in Render logs
         return jsonify({'error': 'Registration failed', 'details': str(e)}), 500
 
-@app.route('/api/login', methods=['POST'])
+@api.route('/api/login', methods=['POST'])
 def login():
     data = request.get_json()
     username = data.get('username')
     password = data.get('password')
+    # username has a unique index, so this is an index lookup.
     user = User.query.filter_by(username=username).first()
-    if user and user.check_password(password):
+    try:
+        valid = user is not None and user.check_password(password)
+    except PasswordHashBusy:
+        return jsonify({"error": "Server is busy, please retry shortly"}), 503
+    if valid:
         login_user(user)
         return jsonify({"message": "Logged in successfully", "user": {"username": user.username}}), 200
     return jsonify({"error": "Invalid username or password"}), 401
 
-@app.route('/api/logout', methods=['POST'])
+@api.route('/api/logout', methods=['POST'])
 @login_required
 def logout():
+    user_cache.pop(current_user.id)
     logout_user()
     return jsonify({"message": "Logged out successfully"}), 200
 
-@app.route('/api/status', methods=['GET'])
+@api.route('/api/status', methods=['GET'])
 def status():
     if current_user.is_authenticated:
         return jsonify({"logged_in": True, "user": {"username": current_user.username}}), 200
     return jsonify({"logged_in": False}), 200
 
-@app.route('/api/health', methods=['GET'])
+@api.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
@@ -245,33 +2467,61 @@ def health_check():
     })
 
 # --- API Hub Routes ---
-@app.route('/api/apihub/categories', methods=['GET'])
+@api.route('/api/apihub/categories', methods=['GET'])
 @login_required
 def get_api_categories():
-    try:
-        response = requests.get('https://api.publicapis.org/categories')
-        response.raise_for_status()
-        return jsonify(response.json())
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": f"Failed to fetch API categories: {e}"}), 500
+    return Response(get_api_catalog().categories_body, mimetype='application/json')
 
-@app.route('/api/apihub/entries', methods=['GET'])
+@api.route('/api/apihub/entries', methods=['GET'])
 @login_required
 def get_api_entries():
+    """Entries of a category, optionally filtered.
+
+    Filters: auth (none, apiKey, OAuth, ...), https (true/false),
+    cors (yes/no/unknown) and q, words that must all appear in the name or
+    description. category may be omitted when q is given.
+    """
     category = request.args.get('category')
-    if not category:
+    text = request.args.get('q', '').strip()
+    if not category and not text:
         return jsonify({"error": "Category parameter is required"}), 400
-    try:
-        response = requests.get(f'https://api.publicapis.org/entries?category={category}')
-        response.raise_for_status()
-        return jsonify(response.json())
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": f"Failed to fetch API entries: {e}"}), 500
+    auth = request.args.get('auth')
+    if auth is not None:
+        auth = '' if auth.lower() == 'none' else auth.lower()
+    https = request.args.get('https')
+    if https is not None:
+        if https.lower() not in ('true', 'false'):
+            return jsonify({"error": "https must be true or false"}), 400
+        https = https.lower() == 'true'
+    cors = request.args.get('cors')
+    if cors is not None:
+        cors = cors.lower()
+        if cors not in API_HUB_CORS_VALUES:
+            return jsonify({"error": f"cors must be one of {', '.join(API_HUB_CORS_VALUES)}"}), 400
+    body = get_api_catalog().entries_body(category, auth, https, cors, text)
+    return Response(body, mimetype='application/json')
 
 # --- API Routes ---
-@app.route('/api/analyze', methods=['POST'])
+def analysis_entity(owner, repo_name, head_sha, sections):
+    """The response body for an analyzed head, identical however it was produced.
+
+    Only the sections and head_sha are in the body, so the ETag stays valid
+    from the first (miss) response on; whether the cache was hit and how long
+    it took go in the X-Analysis-Cache and Server-Timing headers.
+    """
+    key = (owner.lower(), repo_name.lower(), head_sha)
+    entity = analysis_responses.get(key)
+    if entity is None:
+        body = {name: sections[name] for name in COMBINED_SECTIONS + ('file_structure',)}
+        entity = EncodedBody(json.dumps(dict(body, head_sha=head_sha)).encode('utf-8'))
+        analysis_responses.set(key, entity, len(entity.body) * 2)
+    return entity
+
+@api.route('/api/analyze', methods=['POST'])
 @login_required
 def analyze_repo_route():
+    # A JSON body is required: it forces a CORS preflight, so other sites
+    # cannot start analyses with the user's session cookie.
     data = request.get_json()
     repo_url = data.get('repo_url')
     if not repo_url:
@@ -281,74 +2531,214 @@ def analyze_repo_route():
     if not owner or not repo_name:
         return jsonify({"error": "Invalid GitHub URL"}), 400
 
-    readme_content, error = get_github_readme(owner, repo_name)
-    if error:
-        return jsonify({"error": error}), 500
-    
-    readme_summary, error = summarize_readme_with_gemini(readme_content)
-    if error:
-        return jsonify({"error": error}), 500
+    mode = data.get('mode')
+    if mode and mode not in ANALYSIS_MODES:
+        return jsonify({"error": f"mode must be one of {', '.join(ANALYSIS_MODES)}"}), 400
 
-    file_structure, error = get_github_file_structure(owner, repo_name)
+    result, timings, error = analyze_repository(owner, repo_name, mode)
     if error:
-        return jsonify({"error": error}), 500
+        return jsonify({"error": error, "timings": timings}), 500
 
-    structure_analysis, error = analyze_structure_with_gemini(file_structure)
-    if error:
-        return jsonify({"error": error}), 500
-        
-    setup_guide, error = get_setup_guide_with_gemini(readme_content, file_structure)
+    if 'head_sha' not in result:
+        # The head could not be resolved, so there is nothing to revalidate.
+        return jsonify(dict(result, timings=timings))
+    headers = {
+        'Server-Timing': ', '.join(f"{name};dur={seconds * 1000:.0f}" for name, seconds in timings.items()),
+        'X-Analysis-Cache': result['cache'],
+    }
+    if 'mode' in result:
+        headers['X-Analysis-Mode'] = result['mode']
+    return entity_response(analysis_entity(owner, repo_name, result['head_sha'], result), 'private, no-cache', headers)
+
+@api.route('/api/analyses/<owner>/<repo_name>', methods=['GET'])
+@login_required
+def cached_analysis_route(owner, repo_name):
+    """The cached analysis of a repository's current head, or 404.
+
+    Read-only, so it never starts an analysis: POST /api/analyze does that.
+    Send the ETag of either response in If-None-Match to get a 304 while the
+    head is unchanged.
+    """
+    owner, repo_name = owner.lower(), repo_name.lower()
+    head_sha, error = get_github_head_sha(owner, repo_name)
     if error:
-        return jsonify({"error": error}), 500
+        return jsonify({"error": error}), 502
+    entity = analysis_responses.get((owner, repo_name, head_sha))
+    if entity is None:
+        cached = get_cached_analysis(owner, repo_name, head_sha)
+        if cached is None:
+            return jsonify({"error": "This head has not been analyzed yet"}), 404
+        entity = analysis_entity(owner, repo_name, head_sha, cached)
+    return entity_response(entity, 'private, no-cache', {'X-Analysis-Cache': 'hit'})
 
-    return jsonify({
-        "readme_summary": readme_summary,
-        "structure_analysis": structure_analysis,
-        "setup_guide": setup_guide,
-        "file_structure": file_structure,
-    })
+@api.route('/api/analyze/stream', methods=['GET', 'POST'])
+@login_required
+def analyze_repo_stream_route():
+    data = request.get_json(silent=True) or {}
+    repo_url = data.get('repo_url') or request.args.get('repo_url')
+    if not repo_url:
+        return jsonify({"error": "repo_url is required"}), 400
+
+    owner, repo_name = parse_github_url(repo_url)
+    if not owner or not repo_name:
+        return jsonify({"error": "Invalid GitHub URL"}), 400
+
+    return Response(stream_with_context(stream_analysis(owner, repo_name)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@api.route('/api/analyze/jobs', methods=['POST'])
+@login_required
+def create_analysis_job_route():
+    data = request.get_json(silent=True) or {}
+    repo_url = data.get('repo_url')
+    if not repo_url:
+        return jsonify({"error": "repo_url is required"}), 400
+
+    owner, repo_name = parse_github_url(repo_url)
+    if not owner or not repo_name:
+        return jsonify({"error": "Invalid GitHub URL"}), 400
 
-@app.route('/api/trending', methods=['GET'])
+    try:
+        job, deduplicated = submit_analysis_job(owner, repo_name)
+    except JobQueueFull:
+        return jsonify({"error": "Analysis queue is full, please retry shortly"}), 503
+    return jsonify(dict(job.to_dict(), deduplicated=deduplicated)), 202
+
+@api.route('/api/analyze/jobs/<job_id>', methods=['GET'])
+@login_required
+def get_analysis_job_route(job_id):
+    start_job_workers()
+    job = db.session.get(AnalysisJob, job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+# Operational endpoints are for the scraper and operators only: with
+# METRICS_TOKEN set they require "Authorization: Bearer <token>", otherwise
+# they only answer clients in METRICS_ALLOWED_IPS.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+METRICS_ALLOWED_IPS = {ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()}
+
+def internal_only(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if METRICS_TOKEN:
+            if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {METRICS_TOKEN}"):
+                return jsonify({"error": "Unauthorized"}), 401
+        elif request.remote_addr not in METRICS_ALLOWED_IPS:
+            return jsonify({"error": "Forbidden"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@api.route('/api/metrics', methods=['GET'])
+@internal_only
+def metrics_route():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/api/analyze/cache', methods=['GET'])
+@internal_only
+def analysis_cache_stats_route():
+    with analysis_cache_stats_lock:
+        stats = dict(analysis_cache_stats)
+    lookups = sum(stats.values())
+    hits = stats['memory_hits'] + stats['db_hits']
+    return jsonify(dict(stats,
+                        hit_ratio=round(hits / lookups, 3) if lookups else None,
+                        memory_entries=len(analysis_lru),
+                        memory_bytes=analysis_lru.total_bytes))
+
+@api.route('/api/trending', methods=['GET'])
 def trending_repos_route():
     search_query = request.args.get('search_query', default=None, type=str)
-    headers = {"Authorization": f"Bearer {GITHUB_TOKEN}", "Accept": "application/vnd.github.v3+json"}
-    q = [f"{search_query}"] if search_query else []
-    q.append(f"created:>{(datetime.utcnow() - timedelta(days=730)).strftime('%Y-%m-%d')}")
-    query = '+'.join(q)
-    url = f"https://api.github.com/search/repositories?q={query}&sort=stars&order=desc&per_page=12"
-    
-    try:
-        resp = requests.get(url, headers=headers, timeout=15)
-        resp.raise_for_status()
-        items = resp.json().get('items', [])
-        result = [{
-            'name': r['full_name'],
-            'url': r['html_url'],
-            'stars': r['stargazers_count'],
-            'description': r['description'] or '',
-            'forks': r['forks_count'],
-        } for r in items]
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"error": f"Error searching repos: {e}"}), 500
+    entity, cache_status, error = get_trending(search_query)
+    record_cache('trending', cache_status.lower())
+    if error:
+        return jsonify({"error": error}), 500
+    return entity_response(entity, f'public, max-age={int(TRENDING_CACHE_TTL)}', {'X-Cache': cache_status})
 
-@app.route('/api/posts', methods=['GET'])
+@api.route('/api/posts', methods=['GET'])
+@forum_cached
 def get_posts():
+    """Newest posts first, one page at a time.
+
+    Pass the X-Next-Cursor header of a response as ?before= to fetch the
+    next page; the header is absent on the last page.
+    """
     try:
-        posts = Post.query.order_by(Post.timestamp.desc()).all()
+        limit = parse_limit(request.args.get('limit'), POSTS_PAGE_SIZE, MAX_POSTS_PAGE_SIZE)
+        before = parse_cursor(request.args.get('before'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        query = Post.query
+        repo_name = request.args.get('repo_name')
+        if repo_name:
+            query = query.filter(Post.repo_name == repo_name)
+        if before:
+            query = query.filter(db.tuple_(Post.timestamp, Post.id) < before)
+        posts = query.order_by(Post.timestamp.desc(), Post.id.desc()).limit(limit + 1).all()
+        has_more = len(posts) > limit
+        posts = posts[:limit]
+
+        comment_counts = {}
+        if posts:
+            comment_counts = dict(db.session.query(Comment.post_id, db.func.count(Comment.id))
+                                  .filter(Comment.post_id.in_([post.id for post in posts]))
+                                  .group_by(Comment.post_id).all())
         print(f"Found {len(posts)} posts in database")  # Debug log
-        return jsonify([{
+        response = jsonify([{
             'id': post.id,
             'repo_name': post.repo_name,
             'idea': post.idea,
             'timestamp': post.timestamp.strftime('%Y-%m-%d %H:%M'),
-            'comments_count': len(post.comments)
+            'comments_count': comment_counts.get(post.id, 0)
         } for post in posts])
+        if has_more:
+            response.headers['X-Next-Cursor'] = format_cursor(posts[-1].timestamp, posts[-1].id)
+        return response
     except Exception as e:
         print(f"Error fetching posts: {e}")  # Debug log
         return jsonify({"error": "Failed to fetch posts"}), 500
 
-@app.route('/api/test/create-sample-posts', methods=['POST'])
+@api.route('/api/search', methods=['GET'])
+def search_route():
+    """Ranked full-text search over posts (?type=posts) or comments (?type=comments).
+
+    Snippets are HTML-escaped with matches wrapped in <mark>. Pass the
+    X-Next-Cursor header of a response as ?cursor= to fetch the next page.
+    """
+    text = request.args.get('q', '').strip()
+    if not text:
+        return jsonify({"error": "q is required"}), 400
+    search_type = request.args.get('type', 'posts')
+    if search_type not in SEARCH_TYPES:
+        return jsonify({"error": f"type must be one of {', '.join(SEARCH_TYPES)}"}), 400
+    try:
+        limit = parse_limit(request.args.get('limit'), SEARCH_PAGE_SIZE, MAX_SEARCH_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        offset = int(request.args.get('cursor') or 0)
+    except ValueError:
+        offset = -1
+    if offset < 0 or offset > MAX_SEARCH_OFFSET:
+        return jsonify({"error": f"cursor must be between 0 and {MAX_SEARCH_OFFSET}"}), 400
+
+    try:
+        rows, error = search(search_type, text, limit + 1, offset)
+    except Exception as e:
+        print(f"Error searching {search_type}: {e}")
+        return jsonify({"error": "Search failed"}), 500
+    if error:
+        return jsonify({"error": error}), 501
+    response = jsonify([dict(row, snippet=highlight(row['snippet']), score=round(row['score'], 4),
+                             timestamp=row['timestamp'].strftime('%Y-%m-%d %H:%M'))
+                        for row in rows[:limit]])
+    if len(rows) > limit and offset + limit <= MAX_SEARCH_OFFSET:
+        response.headers['X-Next-Cursor'] = str(offset + limit)
+    return response
+
+@api.route('/api/test/create-sample-posts', methods=['POST'])
 def create_sample_posts():
     """Create sample posts for testing"""
     try:
@@ -367,7 +2757,7 @@ def create_sample_posts():
         db.session.rollback()
         return jsonify({"error": f"Failed to create sample posts: {e}"}), 500
 
-@app.route('/api/posts', methods=['POST'])
+@api.route('/api/posts', methods=['POST'])
 @login_required
 def add_post():
     data = request.get_json()
@@ -386,19 +2776,65 @@ def add_post():
 
 
 # --- Comment (Reply) API ---
-@app.route('/api/posts/<int:post_id>/comments', methods=['GET'])
+@api.route('/api/posts/<int:post_id>/comments', methods=['GET'])
+@forum_cached
 def get_comments(post_id):
-    post = Post.query.get_or_404(post_id)
-    comments = Comment.query.filter_by(post_id=post.id).order_by(Comment.timestamp.asc()).all()
-    return jsonify([
-        {
-            'id': c.id,
-            'text': c.text,
-            'timestamp': c.timestamp.strftime('%Y-%m-%d %H:%M')
-        } for c in comments
-    ])
-
-@app.route('/api/posts/<int:post_id>/comments', methods=['POST'])
+    """Oldest comments first; continue with ?after=<X-Next-Cursor>."""
+    try:
+        limit = parse_limit(request.args.get('limit'), COMMENTS_PAGE_SIZE, MAX_COMMENTS_PAGE_SIZE)
+        after = parse_cursor(request.args.get('after'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    query = Comment.query.filter(Comment.post_id == post_id)
+    if after:
+        query = query.filter(db.tuple_(Comment.timestamp, Comment.id) > after)
+    comments = query.order_by(Comment.timestamp.asc(), Comment.id.asc()).limit(limit + 1).all()
+    if not comments and not after:
+        Post.query.get_or_404(post_id)
+    response = jsonify([c.to_dict() for c in comments[:limit]])
+    if len(comments) > limit:
+        last = comments[limit - 1]
+        response.headers['X-Next-Cursor'] = format_cursor(last.timestamp, last.id)
+    return response
+
+@api.route('/api/comments', methods=['GET'])
+@forum_cached
+def get_comments_batch():
+    """Latest comments for several posts at once, in one windowed query.
+
+    ?post_ids=1,2,3&limit_per_post=N returns {post_id: [comments]}, each list
+    holding that post's newest N comments in chronological order.
+    """
+    try:
+        post_ids = [int(i) for i in request.args.get('post_ids', '').split(',') if i.strip()]
+    except ValueError:
+        return jsonify({"error": "post_ids must be a comma-separated list of integers"}), 400
+    try:
+        limit = parse_limit(request.args.get('limit_per_post'), 5, MAX_COMMENTS_PER_POST)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not post_ids:
+        return jsonify({"error": "post_ids is required"}), 400
+    if len(post_ids) > MAX_BATCH_POST_IDS:
+        return jsonify({"error": f"At most {MAX_BATCH_POST_IDS} post_ids per request"}), 400
+
+    rank = db.func.row_number().over(partition_by=Comment.post_id,
+                                     order_by=(Comment.timestamp.desc(), Comment.id.desc())).label('rank')
+    ranked = (db.session.query(Comment.id, Comment.post_id, Comment.text, Comment.timestamp, rank)
+              .filter(Comment.post_id.in_(post_ids)).subquery())
+    rows = (db.session.query(ranked.c.id, ranked.c.post_id, ranked.c.text, ranked.c.timestamp)
+            .filter(ranked.c.rank <= limit)
+            .order_by(ranked.c.post_id, ranked.c.timestamp.asc(), ranked.c.id.asc()).all())
+    result = {str(post_id): [] for post_id in post_ids}
+    for row in rows:
+        result[str(row.post_id)].append({
+            'id': row.id,
+            'text': row.text,
+            'timestamp': row.timestamp.strftime('%Y-%m-%d %H:%M')
+        })
+    return jsonify(result)
+
+@api.route('/api/posts/<int:post_id>/comments', methods=['POST'])
 @login_required
 def add_comment(post_id):
     post = Post.query.get_or_404(post_id)
@@ -417,15 +2853,12 @@ def add_comment(post_id):
 
 # --- Run the App ---
 if __name__ == '__main__':
-    with app.app_context():
-        try:
-            db.create_all()
-            print("✅ Database initialized successfully")
-        except Exception as e:
-            print(f"⚠️ Database initialization error: {e}")
-            print("📝 Note: Using temporary SQLite database in /tmp/")
+    app = create_app()
+    if not init_database(app):
+        print("📝 Note: Using temporary SQLite database in /tmp/")
     
     port = int(os.getenv('PORT', 5000))
-    debug = os.getenv('FLASK_ENV') != 'production'
-    print(f"🚀 Starting CodeAtlas backend on port {port}")
+    debug = os.getenv('FLASK_ENV') == 'development'
+    # The development server handles one process; production uses gunicorn.conf.py.
+    print(f"🚀 Starting CodeAtlas development server on port {port}")
     app.run(host="0.0.0.0", port=port, debug=debug)
@@ -0,0 +1,95 @@
+"""Compare the combined and split analysis modes against a local stub model.
+
+Runs the analysis pipeline offline (GitHub fetches and Gemini are stubbed)
+and reports Gemini calls, estimated input tokens, latency, fallback rate
+and failure rate per analysis for each mode. Exits non-zero when every run
+of a mode fails, since the comparison is then meaningless.
+
+    python benchmarks/compare_analysis_modes.py --runs 20 --failure-rate 0.1
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('GITHUB_TOKEN', 'benchmark')
+os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.db')}")
+
+import backend1  # noqa: E402
+from benchmarks.stubs import FakeGenerativeModel  # noqa: E402
+
+
+def fake_readme(sections=12):
+    parts = ["# Example project\n\n" + "An example project used for benchmarking. " * 20]
+    for i in range(sections):
+        title = ['Installation', 'Usage', 'Features', 'Configuration', 'API'][i % 5]
+        parts.append(f"## {title} {i}\n\n" + "Some explanatory text. " * 60 + "\n\n```bash\nexample --flag\n```")
+    return "\n\n".join(parts)
+
+
+def fake_tree(files=5000):
+    index = backend1.TreeIndex()
+    for i in range(files):
+        index.add({'path': f"packages/pkg{i % 40}/src/module{i}.py", 'type': 'blob'})
+    for name in ('package.json', 'pyproject.toml', 'README.md', 'src/main.py'):
+        index.add({'path': name, 'type': 'blob'})
+    return index
+
+
+def run_mode(mode, runs, model):
+    latencies, fallbacks, failures, last_error = [], 0, 0, None
+    calls_before, tokens_before = model.calls, model.input_tokens
+    for _ in range(runs):
+        started = time.monotonic()
+        results, _, error = backend1.run_pipeline(backend1.analysis_stages('bench', 'repo', mode=mode))
+        latencies.append(time.monotonic() - started)
+        if error:
+            failures += 1
+            last_error = error
+        elif mode == 'combined' and not results.get('combined'):
+            fallbacks += 1
+    return {
+        'mode': mode,
+        'calls': (model.calls - calls_before) / runs,
+        'input_tokens': (model.input_tokens - tokens_before) / runs,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'max_ms': max(latencies) * 1000,
+        'fallback_rate': fallbacks / runs,
+        'failure_rate': failures / runs,
+        'last_error': last_error,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--failure-rate', type=float, default=0.1,
+                        help='probability that the stub returns malformed JSON in combined mode')
+    parser.add_argument('--base-latency', type=float, default=0.05, help='seconds per Gemini call')
+    parser.add_argument('--latency-per-1k', type=float, default=0.01, help='seconds per 1k input tokens')
+    args = parser.parse_args()
+
+    readme, tree = fake_readme(), fake_tree()
+    backend1.get_github_readme = lambda owner, repo_name, ref=None: (readme, None)
+    backend1.get_github_tree = lambda owner, repo_name, ref=None: (tree, None)
+    model = FakeGenerativeModel(args.base_latency, args.latency_per_1k, failure_rate=args.failure_rate)
+    backend1.model = model
+
+    rows = [run_mode(mode, args.runs, model) for mode in backend1.ANALYSIS_MODES]
+    print(f"{'mode':<10}{'calls':>8}{'in tokens':>12}{'p50 ms':>10}{'max ms':>10}{'fallback':>10}{'failed':>8}")
+    for row in rows:
+        print(f"{row['mode']:<10}{row['calls']:>8.2f}{row['input_tokens']:>12.0f}{row['p50_ms']:>10.1f}"
+              f"{row['max_ms']:>10.1f}{row['fallback_rate']:>10.0%}{row['failure_rate']:>8.0%}")
+
+    failed = [row for row in rows if row['failure_rate'] == 1]
+    for row in failed:
+        print(f"FAIL every {row['mode']} run failed: {row['last_error']}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""Offline load test for the CodeAtlas API.
+
+Starts backend1 against a fake GitHub API, a fake Gemini model and a seeded
+database, drives the hot endpoints with N concurrent clients, reports
+p50/p95/p99 latency and throughput, and fails when a scenario regresses
+past benchmarks/baselines.json.
+
+analyze_warm cycles through --analyze-repos repositories whose heads never
+change, so after warmup it measures cache hits. analyze_cold analyzes a
+repository never seen before on every request, so each one runs the full
+GitHub and Gemini pipeline.
+
+A --database-url that already holds posts or comments is refused unless
+--reset is passed, because seeding replaces them.
+
+    python benchmarks/load_test.py --clients 8 --requests 200
+    python benchmarks/load_test.py --database-url postgresql://localhost/codeatlas_bench --reset
+    python benchmarks/load_test.py --update-baselines
+    python benchmarks/load_test.py --scenarios analyze_cold --gunicorn-workers 4
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import requests  # noqa: E402
+
+from benchmarks.stubs import FakeGenerativeModel, FakeGitHub  # noqa: E402
+
+SCENARIOS = ('analyze_warm', 'analyze_cold', 'trending', 'posts', 'comments')
+DEFAULT_BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def seed_database(backend1, app, posts, comments_per_post, seed, reset=False):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    with app.app_context():
+        backend1.create_schema()
+        existing = backend1.Post.query.count() + backend1.Comment.query.count()
+        if existing and not reset:
+            raise SystemExit(f"The database already has {existing} posts and comments; "
+                             "pass --reset to replace them with benchmark data")
+        backend1.db.session.query(backend1.Comment).delete()
+        backend1.db.session.query(backend1.Post).delete()
+        backend1.db.session.commit()
+        rows = [{'repo_name': f"bench/repo{rng.randrange(200)}", 'idea': f"Idea {i} " + 'lorem ipsum ' * rng.randrange(5, 40),
+                 'timestamp': start + timedelta(minutes=i)} for i in range(posts)]
+        backend1.db.session.execute(backend1.Post.__table__.insert(), rows)
+        post_ids = [row.id for row in backend1.db.session.query(backend1.Post.id)]
+        comments = [{'post_id': post_id, 'text': 'Comment ' * rng.randrange(2, 20),
+                     'timestamp': start + timedelta(minutes=rng.randrange(posts * 2))}
+                    for post_id in post_ids for _ in range(rng.randrange(comments_per_post * 2 + 1))]
+        if comments:
+            backend1.db.session.execute(backend1.Comment.__table__.insert(), comments)
+        backend1.db.session.commit()
+    return post_ids
+
+
+def make_client(base_url, index):
+    session = requests.Session()
+    credentials = {'username': f"bench-{index}-{time.time_ns()}", 'password': 'benchmark'}
+    session.post(f"{base_url}/api/register", json=credentials).raise_for_status()
+    session.post(f"{base_url}/api/login", json=credentials).raise_for_status()
+    return session
+
+
+def scenario_request(name, session, base_url, i, post_ids, args):
+    if name == 'analyze_warm':
+        return session.post(f"{base_url}/api/analyze",
+                            json={'repo_url': f"https://github.com/bench/repo{i % args.analyze_repos}"})
+    if name == 'analyze_cold':
+        # FakeGitHub derives the head SHA from the repo name, so a new name
+        # is a head with no cached or previous analysis.
+        return session.post(f"{base_url}/api/analyze",
+                            json={'repo_url': f"https://github.com/bench/cold-{args.run_id}-{i}"})
+    if name == 'trending':
+        query = '' if i % 4 else f"?search_query=topic{i % 10}"
+        return session.get(f"{base_url}/api/trending{query}")
+    if name == 'posts':
+        query = '?limit=20' if i % 3 else f"?limit=20&repo_name=bench/repo{i % 200}"
+        return session.get(f"{base_url}/api/posts{query}")
+    return session.get(f"{base_url}/api/posts/{post_ids[i % len(post_ids)]}/comments")
+
+
+def run_scenario(name, clients, base_url, post_ids, args, requests_count=None, first=0):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    counter = iter(range(first, first + (requests_count or args.requests)))
+
+    def worker(session):
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            started = time.perf_counter()
+            try:
+                response = scenario_request(name, session, base_url, i, post_ids, args)
+                failed = response.status_code >= 400 and f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                failed = str(e)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if failed:
+                    errors.append(failed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+        list(executor.map(worker, clients))
+    wall = time.perf_counter() - started
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'throughput_rps': round(len(latencies) / wall, 1),
+    }
+
+
+def start_gunicorn(args):
+    """Serve benchmarks.stubbed_app with gunicorn.conf.py; returns (process, base_url)."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(args.gunicorn_workers),
+               GUNICORN_WORKER_CLASS=args.worker_class, BENCH_GEMINI_LATENCY=str(args.gemini_latency),
+               BENCH_SEED=str(args.seed))
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+                                'benchmarks.stubbed_app:create_app()'],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/api/health", timeout=1).ok:
+                return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not become healthy within 30s")
+
+
+def compare(results, baselines, tolerance):
+    failures = []
+    for name, result in results.items():
+        if result['errors']:
+            failures.append(f"{name}: {result['errors']} failed requests")
+        baseline = baselines.get(name)
+        if not baseline:
+            continue
+        if result['p95_ms'] > baseline['p95_ms'] * tolerance:
+            failures.append(f"{name}: p95 {result['p95_ms']}ms > {baseline['p95_ms']}ms x {tolerance}")
+        if result['throughput_rps'] < baseline['throughput_rps'] / tolerance:
+            failures.append(f"{name}: {result['throughput_rps']} req/s < {baseline['throughput_rps']} req/s / {tolerance}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--posts', type=int, default=5000)
+    parser.add_argument('--comments-per-post', type=int, default=5)
+    parser.add_argument('--analyze-repos', type=int, default=20, help='distinct repos cycled by analyze_warm')
+    parser.add_argument('--github-latency', type=float, default=0.02)
+    parser.add_argument('--gemini-latency', type=float, default=0.05)
+    parser.add_argument('--tree-size', type=int, default=2000)
+    parser.add_argument('--database-url', help='defaults to a fresh SQLite file')
+    parser.add_argument('--reset', action='store_true', help='replace posts and comments in a non-empty database')
+    parser.add_argument('--gunicorn-workers', type=int, default=0,
+                        help='serve with gunicorn.conf.py and this many workers instead of in-process')
+    parser.add_argument('--worker-class', default='gthread', choices=('gthread', 'gevent'))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baselines', default=DEFAULT_BASELINES)
+    parser.add_argument('--tolerance', type=float, default=2.0, help='allowed slowdown factor versus the baselines')
+    parser.add_argument('--update-baselines', action='store_true')
+    args = parser.parse_args()
+    # Keeps analyze_cold repos unique across runs against the same database.
+    args.run_id = time.time_ns()
+
+    github = FakeGitHub(latency=args.github_latency, tree_size=args.tree_size, seed=args.seed).start()
+    os.environ['GITHUB_API_URL'] = github.url
+    os.environ.setdefault('GITHUB_TOKEN', 'benchmark')
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+    # The app logs to stdout on hot paths; keep the report readable.
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        import backend1
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        backend1.model = FakeGenerativeModel(base_latency=args.gemini_latency, seed=args.seed)
+        app = backend1.create_app({'SESSION_COOKIE_SECURE': False})
+        post_ids = seed_database(backend1, app, args.posts, args.comments_per_post, args.seed, args.reset)
+
+        if args.gunicorn_workers:
+            server, base_url = start_gunicorn(args)
+        else:
+            server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+            threading.Thread(target=server.serve_forever, name='bench-server', daemon=True).start()
+            base_url = f"http://127.0.0.1:{server.server_port}"
+        clients = [make_client(base_url, i) for i in range(args.clients)]
+
+        results = {}
+        for name in args.scenarios.split(','):
+            # Warm connection pools, caches and background threads first.
+            warmup = len(clients) * 2
+            run_scenario(name, clients, base_url, post_ids, args, requests_count=warmup)
+            # Measured requests continue the numbering, so analyze_cold never
+            # repeats a repo analyzed during warmup.
+            results[name] = run_scenario(name, clients, base_url, post_ids, args, first=warmup)
+        # Idle keep-alive connections would hold gthread workers open for the
+        # whole graceful period.
+        for client in clients:
+            client.close()
+        if args.gunicorn_workers:
+            server.terminate()
+            server.wait()
+        else:
+            server.shutdown()
+        github.stop()
+
+    print(f"{'scenario':<14}{'reqs':>6}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}")
+    for name, result in results.items():
+        print(f"{name:<14}{result['requests']:>6}{result['errors']:>8}{result['p50_ms']:>10}"
+              f"{result['p95_ms']:>10}{result['p99_ms']:>10}{result['throughput_rps']:>9}")
+
+    if args.update_baselines:
+        with open(args.baselines, 'w') as f:
+            json.dump({name: {'p95_ms': r['p95_ms'], 'throughput_rps': r['throughput_rps']}
+                       for name, r in results.items()}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baselines written to {args.baselines}")
+        return 0
+
+    baselines = {}
+    # The baselines were recorded in-process; under gunicorn only errors count.
+    if os.path.exists(args.baselines) and not args.gunicorn_workers:
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+    failures = compare(results, baselines, args.tolerance)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""Cold-start benchmark for the CodeAtlas API.
+
+Spawns fresh interpreters and times importing backend1, building the app with
+create_app() and serving the first /api/health response. Fails when the
+median time to the first healthy response exceeds --max-ms, or when startup
+imported google.generativeai, which must only load on the first analysis.
+
+    python benchmarks/startup_time.py --runs 5 --max-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import backend1
+imported = time.perf_counter()
+app = backend1.create_app()
+created = time.perf_counter()
+response = app.test_client().get('/api/health')
+healthy = time.perf_counter()
+print(json.dumps({
+    'status': response.status_code,
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_health_ms': (healthy - created) * 1000,
+    'total_ms': (healthy - started) * 1000,
+    'gemini_imported': 'google.generativeai' in sys.modules,
+}))
+'''
+
+
+def run_once(env):
+    output = subprocess.run([sys.executable, '-c', CHILD, ROOT], env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-ms', type=float, default=1500, help='allowed median time to the first healthy response')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('GITHUB_TOKEN', 'benchmark')
+    env.setdefault('GEMINI_API_KEY', 'benchmark')
+    env.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+    runs = [run_once(env) for _ in range(args.runs)]
+    print(f"{'stage':<16}{'median ms':>10}{'max ms':>10}")
+    for stage in ('import_ms', 'create_app_ms', 'first_health_ms', 'total_ms'):
+        values = [run[stage] for run in runs]
+        print(f"{stage:<16}{statistics.median(values):>10.1f}{max(values):>10.1f}")
+
+    failures = []
+    if any(run['status'] != 200 for run in runs):
+        failures.append("/api/health did not return 200")
+    if any(run['gemini_imported'] for run in runs):
+        failures.append("google.generativeai was imported during startup")
+    median_total = statistics.median(run['total_ms'] for run in runs)
+    if median_total > args.max_ms:
+        failures.append(f"median startup {median_total:.1f}ms > {args.max_ms:g}ms")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,16 @@
+"""WSGI entry point serving backend1 with the fake Gemini model.
+
+Used by load_test.py --gunicorn-workers; point GITHUB_API_URL at a FakeGitHub.
+
+    gunicorn -c gunicorn.conf.py 'benchmarks.stubbed_app:create_app()'
+"""
+import os
+
+import backend1
+from benchmarks.stubs import FakeGenerativeModel
+
+
+def create_app():
+    backend1.model = FakeGenerativeModel(base_latency=float(os.getenv('BENCH_GEMINI_LATENCY', 0.05)),
+                                         seed=int(os.getenv('BENCH_SEED', 0)))
+    return backend1.create_app({'SESSION_COOKIE_SECURE': False})
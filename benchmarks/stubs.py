@@ -0,0 +1,178 @@
+"""Offline stand-ins for GitHub and Gemini used by the benchmarks."""
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """Stands in for genai.GenerativeModel.
+
+    Latency is base_latency plus latency_per_1k_tokens per 1k input tokens.
+    Streamed responses yield stream_chunks pieces spaced evenly over that
+    time. With failure_rate, structured (JSON) responses come back malformed.
+    """
+
+    def __init__(self, base_latency=0.05, latency_per_1k_tokens=0.01, stream_chunks=8, failure_rate=0.0, seed=0):
+        self.base_latency = base_latency
+        self.latency_per_1k_tokens = latency_per_1k_tokens
+        self.stream_chunks = stream_chunks
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.input_tokens = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, generation_config=None, stream=False, request_options=None):
+        tokens = (len(prompt) + 3) // 4
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += tokens
+            malformed = self.random.random() < self.failure_rate
+        latency = self.base_latency + tokens / 1000 * self.latency_per_1k_tokens
+        if generation_config and generation_config.get('response_mime_type') == 'application/json':
+            time.sleep(latency)
+            if malformed:
+                return StubResponse('{"readme_summary": "- cut off mid')
+            sections = ('readme_summary', 'structure_analysis', 'setup_guide')
+            return StubResponse(json.dumps({s: "- point one\n- point two" for s in sections}))
+        text = "## Overview\n\n- point one\n- point two\n\n```bash\nmake run\n```\n"
+        if not stream:
+            time.sleep(latency)
+            return StubResponse(text)
+        return self._stream(text, latency)
+
+    def _stream(self, text, latency):
+        size = max(1, len(text) // self.stream_chunks)
+        for i in range(0, len(text), size):
+            time.sleep(latency / self.stream_chunks)
+            yield StubResponse(text[i:i + size])
+
+
+class FakeGitHub:
+    """Minimal GitHub REST API served from a local thread.
+
+    Serves commits/HEAD, readme, repository info, git/trees (optionally
+    truncated) and search/repositories, with configurable latency, tree size
+    and rate-limit headers. Responses carry ETags and honour If-None-Match.
+    """
+
+    def __init__(self, latency=0.02, tree_size=2000, truncate_trees=False, rate_limit=5000,
+                 readme_bytes=20000, seed=0):
+        self.latency = latency
+        self.tree_size = tree_size
+        self.truncate_trees = truncate_trees
+        self.rate_limit = rate_limit
+        self.remaining = rate_limit
+        self.readme = self._make_readme(readme_bytes, random.Random(seed))
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-github', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @staticmethod
+    def _make_readme(size, rng):
+        parts = ["# Benchmark project\n\n[![CI](https://img.shields.io/ci.svg)](https://ci)\n\nA project for benchmarks."]
+        titles = ['Installation', 'Usage', 'Features', 'Configuration', 'License', 'Contributors']
+        while sum(len(p) for p in parts) < size:
+            words = ' '.join(rng.choice(['fast', 'simple', 'server', 'client', 'data', 'build']) for _ in range(80))
+            parts.append(f"## {rng.choice(titles)}\n\n{words}\n\n```bash\npip install example\n```")
+        return "\n\n".join(parts)
+
+    def _tree_entries(self, prefix='', count=None):
+        for i in range(self.tree_size if count is None else count):
+            yield {"path": f"{prefix}pkg{i % 40}/src/module{i}.py", "mode": "100644", "type": "blob",
+                   "sha": hashlib.sha1(str(i).encode()).hexdigest(), "size": 100}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=b'', content_type='application/json', etag=None):
+                with fake._lock:
+                    fake.requests += 1
+                    if status != 304:
+                        fake.remaining = max(fake.remaining - 1, 0)
+                    remaining = fake.remaining
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('X-RateLimit-Limit', str(fake.rate_limit))
+                self.send_header('X-RateLimit-Remaining', str(remaining))
+                self.send_header('X-RateLimit-Reset', str(int(time.time()) + 3600))
+                if etag:
+                    self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _json(self, data):
+                body = json.dumps(data).encode()
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()
+                if self.headers.get('If-None-Match') == etag:
+                    return self._send(304)
+                return self._send(200, body, etag=etag)
+
+            def do_GET(self):
+                time.sleep(fake.latency)
+                path = urlparse(self.path).path
+                parts = path.strip('/').split('/')
+                if path.startswith('/search/repositories'):
+                    return self._json({"items": [{
+                        "full_name": f"bench/repo{i}", "html_url": f"https://github.com/bench/repo{i}",
+                        "stargazers_count": 1000 - i, "description": "Benchmark repository", "forks_count": i,
+                    } for i in range(12)]})
+                if len(parts) < 3 or parts[0] != 'repos':
+                    return self._send(404, b'{"message": "Not Found"}')
+                if len(parts) == 3:
+                    return self._json({"default_branch": "main"})
+                if parts[3] == 'commits':
+                    sha = hashlib.sha1(f"{parts[1]}/{parts[2]}".encode()).hexdigest()
+                    return self._send(200, sha.encode(), content_type='application/vnd.github.sha')
+                if parts[3] == 'readme':
+                    content = base64.b64encode(fake.readme.encode()).decode()
+                    return self._json({"content": content, "encoding": "base64"})
+                if parts[3:5] == ['git', 'trees']:
+                    recursive = 'recursive=1' in self.path
+                    if recursive and fake.truncate_trees and not parts[5].startswith('sub'):
+                        entries, truncated = list(fake._tree_entries(count=100)), True
+                    elif not recursive:
+                        entries = [{"path": f"pkg{i}", "type": "tree", "sha": f"sub{i}"} for i in range(40)]
+                        truncated = False
+                    elif parts[5].startswith('sub'):
+                        entries = list(fake._tree_entries(count=fake.tree_size // 40))
+                        entries = [dict(e, path=e['path'].split('/', 1)[1]) for e in entries]
+                        truncated = False
+                    else:
+                        entries, truncated = list(fake._tree_entries()), False
+                    return self._json({"sha": parts[5], "tree": entries, "truncated": truncated})
+                return self._send(404, b'{"message": "Not Found"}')
+
+        return Handler
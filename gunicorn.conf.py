@@ -0,0 +1,101 @@
+"""Gunicorn settings: gunicorn -c gunicorn.conf.py
+
+The app is built once in the master (preload_app) and forked into workers, so
+each worker skips the imports and app setup. backend1 resets inherited
+database and GitHub connections in the child via os.register_at_fork.
+Run `flask --app backend1 init-db` before starting to create the schema.
+
+Requests mostly wait on GitHub and Gemini, so workers are sized for I/O:
+  GUNICORN_WORKER_CLASS        gthread (default), or gevent for many long waits
+  WEB_CONCURRENCY              worker processes; default from CPUs and memory
+  WORKER_MEMORY_MB             memory budgeted per worker (default 256)
+  GUNICORN_THREADS             threads per gthread worker
+  GUNICORN_WORKER_CONNECTIONS  concurrent requests per gevent worker
+  GUNICORN_TIMEOUT             seconds before a silent worker is restarted
+  GUNICORN_GRACEFUL_TIMEOUT    seconds a stopping worker gets to drain analyses
+The database pool is sized from the exported WEB_CONCURRENCY and
+WORKER_CONCURRENCY, see backend1.database_engine_options.
+"""
+import os
+import signal
+import time
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class == 'gevent':
+    # Patch before the app is preloaded, so its sockets, locks and thread
+    # pools are created cooperative.
+    from gevent import monkey
+    monkey.patch_all()
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        pass
+
+
+def available_memory_mb():
+    """The container's memory limit if cgroups set one, else physical memory."""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 50:
+            return int(value) // (1024 * 1024)
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return 1024
+
+
+cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+memory_workers = available_memory_mb() // int(os.getenv('WORKER_MEMORY_MB', 256))
+workers = int(os.getenv('WEB_CONCURRENCY', max(1, min(2 * cpus + 1, memory_workers))))
+# About eight concurrent requests per CPU, spread over the workers.
+threads = int(os.getenv('GUNICORN_THREADS', max(4, min(32, 8 * cpus // workers))))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 200))
+
+# Read by backend1 when it sizes the database pool.
+os.environ['WEB_CONCURRENCY'] = str(workers)
+os.environ['WORKER_CONCURRENCY'] = str(worker_connections if worker_class == 'gevent' else threads)
+
+wsgi_app = 'backend1:create_app()'
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+preload_app = True
+# Analyses wait on GitHub and Gemini for a while.
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 180))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 120))
+
+
+# Seconds kept back from the graceful period for the worker to exit before
+# the arbiter's SIGKILL.
+EXIT_MARGIN = 10
+
+
+def post_worker_init(worker):
+    # Threads do not survive the fork, so start the analysis job workers in
+    # each worker; they pick up jobs whose previous owner has exited.
+    import backend1
+    backend1.start_job_workers(worker.wsgi)
+
+    # The graceful period starts when the arbiter sends SIGTERM; note when
+    # that was so worker_exit only drains for the time that is left.
+    handle_exit = worker.handle_exit
+
+    def record_exit(sig, frame):
+        worker.stop_requested_at = time.monotonic()
+        handle_exit(sig, frame)
+    signal.signal(signal.SIGTERM, record_exit)
+
+
+def worker_int(worker):
+    worker.stop_requested_at = time.monotonic()
+
+
+def worker_exit(server, worker):
+    # In-flight requests have finished; give queued analysis jobs the rest
+    # of the graceful period.
+    import backend1
+    elapsed = time.monotonic() - getattr(worker, 'stop_requested_at', time.monotonic())
+    backend1.drain_analysis_jobs(max(0, graceful_timeout - elapsed - EXIT_MARGIN))